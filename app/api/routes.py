@@ -1,7 +1,16 @@
 """API routes for accessing pipeline results."""
-from flask import Blueprint, jsonify, request
+from flask import (
+    Blueprint, Response, current_app, jsonify, make_response, request, stream_with_context
+)
+from sqlalchemy import select, func, inspect, text
+from sqlalchemy.orm import selectinload
+from functools import wraps
+from itertools import chain, groupby
+from operator import itemgetter
 import logging
+import orjson
 
+from app.cache import cache, get_data_version, is_cacheable
 from app.db import session_scope
 from app.models import (
     StoreSection, GraphEdge, Recommendation, 
@@ -11,60 +20,324 @@ from app.models import (
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
 
+# All dashboard counts in a single round-trip
+STATS_SQL = text("""
+    SELECT 'sections', COUNT(*) FROM store_section
+    UNION ALL SELECT 'products', COUNT(*) FROM product
+    UNION ALL SELECT 'graph_edges', COUNT(*) FROM graph_edge
+    UNION ALL SELECT 'communities', COUNT(DISTINCT community_id) FROM section_community
+    UNION ALL SELECT 'product_clusters', COUNT(DISTINCT cluster_id) FROM product_cluster
+    UNION ALL SELECT 'recommendations', COUNT(*) FROM recommendation
+""")
+
+# Pagination limits
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 1000
+
+# Rows fetched per round-trip when streaming large responses
+STREAM_BATCH_SIZE = 1000
+
+# Seconds clients may reuse a response before revalidating its ETag
+RESPONSE_MAX_AGE = 60
+
+# Largest streamed body kept in the response cache; bigger ones stream uncached
+MAX_CACHED_STREAM_BYTES = 8 * 1024 * 1024
+
+
+def get_data_etag() -> str:
+    """Get the ETag for pipeline output, derived from the current data version.
+    
+    Returns:
+        ETag value such as 'data-3f2a9c0b1d4e'
+    """
+    return f"data-{get_data_version()}"
+
+
+def etag_by_data_version(view):
+    """Answer with 304 Not Modified when the client already has the current data.
+    
+    Every pipeline save bumps the data version, so repeat polls between
+    writes skip the query and serialization entirely.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            etag = get_data_etag()
+        except Exception as e:
+            logger.warning(f"Could not compute ETag: {e}")
+            return view(*args, **kwargs)
+        
+        # Flask-Compress appends ':br' / ':gzip' to the ETag it sends out
+        client_tags = request.if_none_match.as_set(include_weak=True)
+        if any(tag.split(':')[0] == etag for tag in client_tags):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag)
+        response.cache_control.max_age = RESPONSE_MAX_AGE
+        return response
+    
+    return wrapper
+
+
+def get_pagination():
+    """Read optional pagination parameters from the query string.
+    
+    Returns:
+        Tuple of (page, per_page), or None if the client did not request a page
+    """
+    if 'page' not in request.args and 'per_page' not in request.args:
+        return None
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    return page, per_page
+
+
+def paginate(session, stmt, model, pagination):
+    """Restrict a select statement to one page of results.
+    
+    Args:
+        session: Active database session
+        stmt: Select statement to paginate
+        model: Model class to count rows of and order by primary key
+        pagination: Tuple of (page, per_page) from get_pagination()
+    
+    Returns:
+        Tuple of (paginated statement, pagination metadata dict)
+    """
+    page, per_page = pagination
+    total = session.scalar(select(func.count()).select_from(model))
+    
+    stmt = stmt.order_by(*inspect(model).primary_key).limit(per_page).offset((page - 1) * per_page)
+    return stmt, {'page': page, 'per_page': per_page, 'total': total}
+
+
+def select_sections():
+    """Build a Core select of section columns with their community assignment.
+    
+    Returns:
+        Select statement yielding section_id, name, x, y, community_id rows
+    """
+    return select(
+        StoreSection.section_id,
+        StoreSection.name,
+        StoreSection.x,
+        StoreSection.y,
+        SectionCommunity.community_id
+    ).outerjoin(SectionCommunity, SectionCommunity.section_id == StoreSection.section_id)
+
+
+def iter_json_rows(result):
+    """Serialize a mappings result as comma-separated JSON objects, batch by batch.
+    
+    Args:
+        result: Mappings result fetched with a yield_per execution option
+    
+    Yields:
+        bytes: Serialized rows for one batch
+    
+    Returns:
+        int: Number of rows written
+    """
+    count = 0
+    for batch in result.partitions():
+        yield (b',' if count else b'') + b','.join(orjson.dumps(dict(row)) for row in batch)
+        count += len(batch)
+    return count
+
+
+def stream_rows(stmt, model, pagination):
+    """Yield a {success, data, count} JSON document for a Core select in chunks.
+    
+    Args:
+        stmt: Core select statement returning the row fields
+        model: Model class used for pagination
+        pagination: Tuple of (page, per_page), or None for all rows
+    
+    Yields:
+        bytes: Consecutive pieces of the JSON document
+    """
+    with session_scope() as session:
+        page_info = {}
+        if pagination:
+            stmt, page_info = paginate(session, stmt, model, pagination)
+        
+        rows = session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).mappings()
+        
+        yield b'{"success":true,"data":['
+        count = yield from iter_json_rows(rows)
+        yield b'],' + orjson.dumps({'count': count, **page_info})[1:]
+
+
+def stream_graph(pagination):
+    """Yield the /graph JSON body in chunks.
+    
+    Args:
+        pagination: Tuple of (page, per_page) for edges, or None for all edges
+    
+    Yields:
+        bytes: Consecutive pieces of the JSON document
+    """
+    with session_scope() as session:
+        # Get sections (nodes)
+        nodes = session.execute(select_sections()).mappings().all()
+        
+        yield b'{"success":true,"data":{"nodes":' + orjson.dumps([dict(n) for n in nodes])
+        
+        # Get edges (only edges are paginated, nodes are always complete)
+        stmt = select(
+            GraphEdge.src_section_id.label('source'),
+            GraphEdge.dst_section_id.label('target'),
+            GraphEdge.weight
+        )
+        
+        page_info = {}
+        if pagination:
+            stmt, page_info = paginate(session, stmt, GraphEdge, pagination)
+        
+        edges = session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).mappings()
+        
+        yield b',"edges":['
+        yield from iter_json_rows(edges)
+        yield b']}' + (b',' + orjson.dumps(page_info)[1:-1] if page_info else b'') + b'}'
+
+
+def stream_response(chunks):
+    """Wrap a generator of JSON chunks in a streaming response.
+    
+    The first chunk is produced eagerly so that database errors are raised
+    here (and turned into a 500) instead of after the response has started.
+    
+    Args:
+        chunks: Generator yielding bytes
+    
+    Returns:
+        Streaming Flask response
+    """
+    first = next(chunks)
+    return Response(stream_with_context(chain([first], chunks)), mimetype='application/json')
+
+
+def store_streamed_body(chunks, key: str, app):
+    """Pass streamed chunks through, caching the whole body once it completes.
+    
+    Nothing is stored if the client disconnects early or the body grows past
+    MAX_CACHED_STREAM_BYTES.
+    
+    Args:
+        chunks: Iterable of bytes produced by the streaming response
+        key: Cache key for the complete body
+        app: Flask application whose cache receives the body
+    
+    Yields:
+        bytes: The chunks, unchanged
+    """
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= MAX_CACHED_STREAM_BYTES:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+    finally:
+        # Closing the inner generator ends its database session on disconnect
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    
+    if parts is not None:
+        with app.app_context():
+            try:
+                cache.set(key, b''.join(parts))
+            except Exception as e:
+                logger.warning(f"Could not cache streamed response: {e}")
+
+
+def cached_stream(view):
+    """Serve streamed JSON endpoints from cached body bytes.
+    
+    The first request for a URL streams from the database and stores the
+    serialized body under the current data version; identical requests
+    after that are answered from those bytes until the next clear_cache().
+    The version is read from the database, so a pipeline run also retires
+    bodies held in per-process caches of other workers.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_app.config.get('CACHE_TYPE') == 'NullCache':
+            return view(*args, **kwargs)
+        
+        try:
+            key = f"stream_{get_data_version()}_{request.full_path}"
+            body = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Could not read response cache: {e}")
+            return view(*args, **kwargs)
+        
+        if body is not None:
+            return Response(body, mimetype='application/json')
+        
+        response = view(*args, **kwargs)
+        if isinstance(response, Response) and response.is_streamed:
+            response.response = store_streamed_body(
+                response.response, key, current_app._get_current_object()
+            )
+        return response
+    
+    return wrapper
+
 
 @api_bp.route('/sections', methods=['GET'])
+@etag_by_data_version
+@cached_stream
 def get_sections():
     """Get all store sections with coordinates and community assignments.
     
+    Query params:
+        page: Page number, starting at 1 (default: all rows)
+        per_page: Rows per page (default: 100, max: 1000)
+    
     Returns:
         JSON array of sections
     """
     try:
-        with session_scope() as session:
-            sections = session.query(StoreSection).all()
-            
-            result = [section.to_dict() for section in sections]
-            
-            return jsonify({
-                'success': True,
-                'count': len(result),
-                'data': result
-            })
+        return stream_response(stream_rows(select_sections(), StoreSection, get_pagination()))
     except Exception as e:
         logger.error(f"Error fetching sections: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @api_bp.route('/graph', methods=['GET'])
+@etag_by_data_version
+@cached_stream
 def get_graph():
     """Get graph edges with weights.
     
+    Query params:
+        page: Page number for edges, starting at 1 (default: all edges)
+        per_page: Edges per page (default: 100, max: 1000)
+    
     Returns:
         JSON object with nodes and edges
     """
     try:
-        with session_scope() as session:
-            # Get sections (nodes)
-            sections = session.query(StoreSection).all()
-            nodes = [section.to_dict() for section in sections]
-            
-            # Get edges
-            edges = session.query(GraphEdge).all()
-            edges_data = [edge.to_dict() for edge in edges]
-            
-            return jsonify({
-                'success': True,
-                'data': {
-                    'nodes': nodes,
-                    'edges': edges_data
-                }
-            })
+        return stream_response(stream_graph(get_pagination()))
     except Exception as e:
         logger.error(f"Error fetching graph: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @api_bp.route('/recommendations', methods=['GET'])
+@etag_by_data_version
+@cache.cached(query_string=True, response_filter=is_cacheable)
 def get_recommendations():
     """Get layout recommendations.
     
@@ -80,19 +353,22 @@ def get_recommendations():
         sort_by = request.args.get('sort', 'score')
         
         with session_scope() as session:
-            query = session.query(Recommendation)
+            stmt = select(Recommendation).options(
+                selectinload(Recommendation.product),
+                selectinload(Recommendation.recommended_section)
+            )
             
             # Sort
             if sort_by == 'score':
-                query = query.order_by(Recommendation.score.desc())
+                stmt = stmt.order_by(Recommendation.score.desc())
             else:
-                query = query.order_by(Recommendation.product_id)
+                stmt = stmt.order_by(Recommendation.product_id)
             
             # Limit
             if limit:
-                query = query.limit(limit)
+                stmt = stmt.limit(limit)
             
-            recommendations = query.all()
+            recommendations = session.execute(stmt).scalars().all()
             result = [rec.to_dict() for rec in recommendations]
             
             return jsonify({
@@ -106,28 +382,36 @@ def get_recommendations():
 
 
 @api_bp.route('/products', methods=['GET'])
+@etag_by_data_version
+@cached_stream
 def get_products():
     """Get all products with cluster assignments.
     
+    Query params:
+        page: Page number, starting at 1 (default: all rows)
+        per_page: Rows per page (default: 100, max: 1000)
+    
     Returns:
         JSON array of products
     """
     try:
-        with session_scope() as session:
-            products = session.query(Product).all()
-            result = [product.to_dict() for product in products]
-            
-            return jsonify({
-                'success': True,
-                'count': len(result),
-                'data': result
-            })
+        stmt = select(
+            Product.product_id,
+            Product.name,
+            Product.category,
+            Product.current_section_id,
+            ProductCluster.cluster_id
+        ).outerjoin(ProductCluster, ProductCluster.product_id == Product.product_id)
+        
+        return stream_response(stream_rows(stmt, Product, get_pagination()))
     except Exception as e:
         logger.error(f"Error fetching products: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @api_bp.route('/communities', methods=['GET'])
+@etag_by_data_version
+@cache.cached(query_string=True, response_filter=is_cacheable)
 def get_communities():
     """Get section community assignments.
     
@@ -136,16 +420,22 @@ def get_communities():
     """
     try:
         with session_scope() as session:
-            communities = session.query(SectionCommunity).all()
-            result = [comm.to_dict() for comm in communities]
+            rows = session.execute(
+                select(SectionCommunity.community_id, SectionCommunity.section_id)
+                .order_by(SectionCommunity.community_id, SectionCommunity.section_id)
+            ).all()
             
-            # Group by community
-            by_community = {}
-            for comm in result:
-                cid = comm['community_id']
-                if cid not in by_community:
-                    by_community[cid] = []
-                by_community[cid].append(comm['section_id'])
+            # Group by community (rows arrive sorted, so one pass is enough)
+            by_community = {
+                cid: [section_id for _, section_id in members]
+                for cid, members in groupby(rows, key=itemgetter(0))
+            }
+            
+            result = [
+                {'section_id': section_id, 'community_id': cid}
+                for cid, section_ids in by_community.items()
+                for section_id in section_ids
+            ]
             
             return jsonify({
                 'success': True,
@@ -159,6 +449,8 @@ def get_communities():
 
 
 @api_bp.route('/stats', methods=['GET'])
+@etag_by_data_version
+@cache.cached(timeout=30, query_string=True, response_filter=is_cacheable)
 def get_stats():
     """Get overall statistics.
     
@@ -167,18 +459,7 @@ def get_stats():
     """
     try:
         with session_scope() as session:
-            stats = {
-                'sections': session.query(StoreSection).count(),
-                'products': session.query(Product).count(),
-                'graph_edges': session.query(GraphEdge).count(),
-                'communities': len(set(
-                    c.community_id for c in session.query(SectionCommunity).all()
-                )),
-                'product_clusters': len(set(
-                    c.cluster_id for c in session.query(ProductCluster).all()
-                )),
-                'recommendations': session.query(Recommendation).count()
-            }
+            stats = {name: int(count) for name, count in session.execute(STATS_SQL)}
             
             return jsonify({
                 'success': True,
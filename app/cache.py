@@ -0,0 +1,181 @@
+"""API response cache shared by the dashboard server and the pipeline."""
+from flask import Flask, g, has_app_context, has_request_context
+from flask_caching import Cache
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+import logging
+import uuid
+
+from app.config import Config
+from app.db import session_scope
+from app.models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+cache = Cache()
+
+# data_version row replaced whenever pipeline output is rewritten
+OUTPUT_VERSION = 'output'
+
+# data_version row replaced whenever movement rows are (re)loaded
+MOVEMENT_VERSION = 'movement'
+
+# Backends held inside one process: clear_cache() from a pipeline script or
+# another worker cannot reach them, so they would serve stale responses
+PER_PROCESS_CACHE_TYPES = {'SimpleCache', 'simple'}
+
+# Seconds to wait for Redis when checking that it is reachable
+REDIS_CONNECT_TIMEOUT = 1
+
+
+def resolve_cache_type() -> str:
+    """Choose the response cache backend, disabling caching if it cannot be shared.
+    
+    Per-process backends and an unreachable Redis both fall back to
+    NullCache (no response caching) with a logged reason, rather than
+    serving responses that pipeline runs cannot invalidate.
+    
+    Returns:
+        Flask-Caching CACHE_TYPE to configure
+    """
+    cache_type = Config.CACHE_TYPE
+    
+    if cache_type in PER_PROCESS_CACHE_TYPES:
+        logger.warning(
+            f"CACHE_TYPE={cache_type} is per-process and cannot be invalidated by "
+            "pipeline runs; response caching disabled (use CACHE_TYPE=RedisCache)"
+        )
+        return 'NullCache'
+    
+    if cache_type == 'RedisCache':
+        try:
+            import redis
+            
+            redis.Redis(
+                host=Config.REDIS_HOST,
+                port=Config.REDIS_PORT,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT
+            ).ping()
+        except Exception as e:
+            logger.error(
+                f"Redis at {Config.REDIS_HOST}:{Config.REDIS_PORT} is unreachable ({e}); "
+                "response caching disabled. Start Redis or set CACHE_TYPE=NullCache"
+            )
+            return 'NullCache'
+    
+    return cache_type
+
+
+def init_cache(app: Flask, cache_type: str = None):
+    """Configure the response cache for a Flask application.
+    
+    Args:
+        app: Flask application to attach the cache to
+        cache_type: Backend to use (default: resolve_cache_type())
+    """
+    app.config['CACHE_TYPE'] = cache_type or resolve_cache_type()
+    app.config['CACHE_REDIS_HOST'] = Config.REDIS_HOST
+    app.config['CACHE_REDIS_PORT'] = Config.REDIS_PORT
+    app.config['CACHE_DEFAULT_TIMEOUT'] = Config.CACHE_DEFAULT_TIMEOUT
+    app.config['CACHE_KEY_PREFIX'] = 'rlo_'
+    
+    cache.init_app(app)
+
+
+def is_cacheable(response) -> bool:
+    """Only cache complete, successful responses.
+    
+    Errors are returned as (body, status) tuples and streamed responses
+    cannot be stored by @cache.cached (streamed endpoints use cached_stream
+    instead), so both are skipped.
+    """
+    if isinstance(response, tuple):
+        return False
+    return not getattr(response, 'is_streamed', False)
+
+
+def get_data_version(name: str = OUTPUT_VERSION) -> str:
+    """Get the token identifying the current version of a data set.
+    
+    The token lives in the data_version table, so every API worker and
+    pipeline process sees the same value. A missing row is created on first
+    use. Within a request the token is read once and kept on flask.g.
+    
+    Args:
+        name: data_version row to read
+    
+    Returns:
+        Short hex token, replaced by every bump_data_version()
+    """
+    if has_request_context() and name in g.setdefault('data_versions', {}):
+        return g.data_versions[name]
+    
+    with session_scope() as session:
+        token = session.scalar(select(DataVersion.token).where(DataVersion.name == name))
+    
+    if token is None:
+        token = bump_data_version(name)
+    elif has_request_context():
+        g.data_versions[name] = token
+    return token
+
+
+def bump_data_version(name: str = OUTPUT_VERSION) -> str:
+    """Replace the token of a data set after its tables were rewritten.
+    
+    Args:
+        name: data_version row to replace
+    
+    Returns:
+        The new token
+    """
+    token = uuid.uuid4().hex[:12]
+    try:
+        with session_scope() as session:
+            updated = session.execute(
+                update(DataVersion)
+                .where(DataVersion.name == name)
+                .values(token=token, updated_at=datetime.utcnow())
+            ).rowcount
+            if not updated:
+                session.add(DataVersion(name=name, token=token))
+    except IntegrityError:
+        # Another process created the row first; its token is just as new
+        return get_data_version(name)
+    
+    if has_request_context():
+        g.setdefault('data_versions', {})[name] = token
+    return token
+
+
+def clear_cache():
+    """Invalidate cached API responses after pipeline results are written.
+    
+    Every save_* step calls this. It bumps the output data version (and with
+    it each response ETag and streamed-body cache key), then clears the
+    cache backend.
+    
+    Works both inside a request and from standalone pipeline scripts, where
+    a throwaway application is created just to reach the shared cache backend.
+    """
+    try:
+        bump_data_version()
+    except Exception as e:
+        logger.warning(f"Could not bump data version: {e}")
+    
+    try:
+        if has_app_context():
+            cache.clear()
+            return
+        
+        # Nothing outside this process to clear
+        if Config.CACHE_TYPE in PER_PROCESS_CACHE_TYPES | {'NullCache'}:
+            return
+        
+        app = Flask(__name__)
+        init_cache(app, Config.CACHE_TYPE)
+        with app.app_context():
+            cache.clear()
+    except Exception as e:
+        logger.warning(f"Could not clear API cache: {e}")
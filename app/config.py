@@ -26,6 +26,20 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # Set to True for SQL query logging
     
+    # Connection Pool Configuration
+    MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 25))
+    MYSQL_MAX_OVERFLOW = int(os.getenv('MYSQL_MAX_OVERFLOW', 25))
+    MYSQL_POOL_TIMEOUT = int(os.getenv('MYSQL_POOL_TIMEOUT', 30))
+    
+    # Bulk CSV ingest via LOAD DATA LOCAL INFILE (server needs local_infile=ON)
+    MYSQL_LOCAL_INFILE = os.getenv('MYSQL_LOCAL_INFILE', 'False').lower() == 'true'
+    
+    # Cache Configuration (API response cache)
+    REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
+    REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'RedisCache')  # 'NullCache' to disable response caching
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 300))
+    
     # Flask Configuration
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
@@ -34,6 +48,9 @@ class Config:
     # Pipeline Configuration
     RANDOM_SEED = int(os.getenv('RANDOM_SEED', 42))
     
+    # Dispatch graph construction to the nx-cugraph GPU backend (if installed)
+    USE_CUGRAPH = os.getenv('USE_CUGRAPH', 'False').lower() == 'true'
+    
     # Data Paths
     DATA_DIR = BASE_DIR / 'data'
     SQL_DIR = BASE_DIR / 'sql'
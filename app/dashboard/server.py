@@ -1,9 +1,12 @@
 """Flask application for the dashboard."""
 from flask import Flask, render_template
 from flask_cors import CORS
+from flask_compress import Compress
 import logging
 
 from app.config import Config
+from app.cache import init_cache
+from app.db import Session, engine
 from app.api.routes import api_bp
 
 # Setup logging
@@ -22,9 +25,33 @@ def create_app():
     # Enable CORS
     CORS(app)
     
+    # Compress JSON payloads (and dashboard assets) with brotli or gzip
+    app.config['COMPRESS_MIMETYPES'] = [
+        'application/json',
+        'text/html',
+        'text/css',
+        'application/javascript'
+    ]
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_LEVEL'] = 4
+    app.config['COMPRESS_BR_LEVEL'] = 4
+    # Flask-Compress buffers a streamed body whole before compressing it, so
+    # streamed endpoints are sent uncompressed to keep their bounded memory;
+    # their cached (non-streamed) bodies are still compressed
+    app.config['COMPRESS_STREAMS'] = False
+    Compress(app)
+    
+    # Response cache for pipeline output endpoints
+    init_cache(app)
+    
     # Register API blueprint
     app.register_blueprint(api_bp)
     
+    # Return pooled connections at the end of every request
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        Session.remove()
+    
     # Dashboard routes
     @app.route('/')
     def index():
@@ -36,6 +63,7 @@ def create_app():
         """Health check endpoint."""
         return {'status': 'healthy', 'service': 'Retail Layout Optimizer'}
     
+    logger.info(f"Database pool: {engine.pool.status()}")
     logger.info("Flask application created successfully")
     return app
 
@@ -45,6 +73,12 @@ app = create_app()
 
 
 if __name__ == '__main__':
+    if Config.FLASK_ENV != 'development':
+        # The built-in server handles one request at a time
+        logger.error("Flask development server is only available with FLASK_ENV=development")
+        logger.error("Run in production with: gunicorn -c gunicorn.conf.py app.dashboard.server:app")
+        raise SystemExit(1)
+    
     logger.info("Starting Retail Layout Optimizer Dashboard...")
     logger.info(f"Dashboard URL: http://localhost:5000")
     logger.info(f"API Base URL: http://localhost:5000/api")
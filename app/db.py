@@ -1,6 +1,7 @@
 """Database connection and session management."""
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from contextlib import contextmanager
 import logging
@@ -14,8 +15,15 @@ logger = logging.getLogger(__name__)
 # Create SQLAlchemy engine
 engine = create_engine(
     Config.SQLALCHEMY_DATABASE_URI,
+    poolclass=QueuePool,
+    pool_size=Config.MYSQL_POOL_SIZE,        # Warm connections kept open
+    max_overflow=Config.MYSQL_MAX_OVERFLOW,  # Extra connections under burst load
+    pool_timeout=Config.MYSQL_POOL_TIMEOUT,  # Seconds to wait for a free connection
     pool_pre_ping=True,  # Verify connections before using
     pool_recycle=3600,   # Recycle connections after 1 hour
+    query_cache_size=1200,  # Compiled statement cache shared by hot API queries
+    connect_args={'local_infile': Config.MYSQL_LOCAL_INFILE},  # LOAD DATA LOCAL ingest
+    future=True,
     echo=Config.SQLALCHEMY_ECHO
 )
 
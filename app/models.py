@@ -1,5 +1,5 @@
 """SQLAlchemy ORM models for the retail layout optimizer."""
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -86,6 +86,11 @@ class Movement(Base):
     section_id = Column(String(10), ForeignKey('store_section.section_id'), nullable=False)
     ts = Column(DateTime, nullable=False, default=datetime.utcnow)
     
+    # Covers the ordered (session, step) scan used to compute transitions
+    __table_args__ = (
+        Index('idx_session', 'session_id', 'step_order', 'section_id'),
+    )
+    
     # Relationships
     section = relationship('StoreSection', back_populates='movements')
     
@@ -112,6 +117,10 @@ class GraphEdge(Base):
     dst_section_id = Column(String(10), ForeignKey('store_section.section_id'), primary_key=True)
     weight = Column(Float, nullable=False, default=0.0)
     
+    __table_args__ = (
+        Index('idx_weight', weight.desc()),
+    )
+    
     # Relationships
     source_section = relationship(
         'StoreSection',
@@ -144,6 +153,10 @@ class SectionCommunity(Base):
     section_id = Column(String(10), ForeignKey('store_section.section_id'), primary_key=True)
     community_id = Column(Integer, nullable=False)
     
+    __table_args__ = (
+        Index('idx_community', 'community_id'),
+    )
+    
     # Relationships
     section = relationship('StoreSection', back_populates='community')
     
@@ -190,6 +203,10 @@ class Recommendation(Base):
     rationale = Column(Text)
     score = Column(Float, nullable=False, default=0.0)
     
+    __table_args__ = (
+        Index('idx_score', score.desc()),
+    )
+    
     # Relationships
     product = relationship('Product', back_populates='recommendation')
     recommended_section = relationship('StoreSection', back_populates='recommendations')
@@ -227,4 +244,29 @@ class RunMetadata(Base):
             'run_id': self.run_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'notes': self.notes
-        }
\ No newline at end of file
+        }
+
+
+class DataVersion(Base):
+    """Token identifying the current contents of a group of tables.
+    
+    Replaced whenever those tables are rewritten, so that API workers and
+    pipeline processes can all tell when data has changed.
+    """
+    
+    __tablename__ = 'data_version'
+    
+    name = Column(String(50), primary_key=True)
+    token = Column(String(32), nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<DataVersion(name='{self.name}', token='{self.token}')>"
+    
+    def to_dict(self):
+        """Convert to dictionary for API responses."""
+        return {
+            'name': self.name,
+            'token': self.token,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -1,124 +1,320 @@
 """Build weighted movement graph from customer paths."""
-import networkx as nx
-import pandas as pd
-from collections import defaultdict
+from __future__ import annotations
+
+from sqlalchemy import delete, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+import heapq
 import logging
-from typing import Tuple, Dict
+from pathlib import Path
+from typing import Tuple, Dict, Union, TYPE_CHECKING
+
+from app.cache import clear_cache
+from app.config import Config
+from app.db import engine, session_scope
+from app.models import GraphEdge
 
-from app.db import session_scope
-from app.models import Movement, GraphEdge
+# networkx, pandas, numpy and scipy are imported inside the functions that use
+# them so that importing this module (e.g. from API workers) stays cheap
+if TYPE_CHECKING:
+    import networkx as nx
+    import numpy as np
+    import pandas as pd
+    from scipy.sparse import csr_matrix
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Movement rows fetched per round-trip when computing transitions
+TRANSITION_BATCH_SIZE = 50_000
+
+# CSV rows read per chunk by build_networkx_graph_from_path without pyarrow
+TRANSITION_FILE_CHUNK_ROWS = 1_000_000
+
+
+def count_transitions(df: pd.DataFrame) -> pd.DataFrame:
+    """Count section-to-section transitions in an ordered block of movements.
+    
+    Args:
+        df: DataFrame with session_id, section_id ordered by session and step
+    
+    Returns:
+        DataFrame with columns: src_section_id, dst_section_id, count
+    """
+    # Previous row's section, only kept when it belongs to the same session
+    prev_section = df['section_id'].shift(1)
+    same_session = df['session_id'].shift(1) == df['session_id']
+    
+    # Keep real transitions, ignoring session starts and self-loops
+    mask = same_session & (prev_section != df['section_id'])
+    
+    return (
+        df.assign(src_section_id=prev_section)[mask]
+        .groupby(['src_section_id', 'section_id'], sort=False)
+        .size()
+        .reset_index(name='count')
+        .rename(columns={'section_id': 'dst_section_id'})
+    )
+
 
 def compute_transitions_from_db() -> pd.DataFrame:
     """Compute section-to-section transitions from movement data.
     
+    Movements are streamed from a server-side cursor in batches of
+    TRANSITION_BATCH_SIZE rows, so memory use does not grow with the table.
+    
     Returns:
         DataFrame with columns: src_section_id, dst_section_id, count
     """
+    import pandas as pd
+    
     logger.info("Computing transitions from movement data...")
     
-    with session_scope() as session:
-        # Get all movements ordered by session and step
-        movements = session.query(Movement).order_by(
-            Movement.session_id,
-            Movement.step_order
-        ).all()
-        
-        logger.info(f"Processing {len(movements)} movement records...")
-        
-        # Count transitions
-        transitions = defaultdict(int)
-        current_session = None
-        prev_section = None
-        
-        for movement in movements:
-            if movement.session_id != current_session:
-                # New session started
-                current_session = movement.session_id
-                prev_section = movement.section_id
-            else:
-                # Transition from prev_section to current section
-                if prev_section != movement.section_id:  # Ignore self-loops
-                    edge = (prev_section, movement.section_id)
-                    transitions[edge] += 1
-                prev_section = movement.section_id
-        
-        logger.info(f"Found {len(transitions)} unique transitions")
-        
-        # Convert to DataFrame
-        transition_data = [
-            {
-                'src_section_id': src,
-                'dst_section_id': dst,
-                'count': count
-            }
-            for (src, dst), count in transitions.items()
-        ]
+    columns = ['session_id', 'section_id']
+    partial_counts = []
+    n_movements = 0
+    carry = None
+    
+    # Get all movements ordered by session and step
+    with engine.connect().execution_options(
+        stream_results=True,
+        max_row_buffer=TRANSITION_BATCH_SIZE
+    ) as conn:
+        result = conn.execute(text(
+            "SELECT session_id, section_id FROM movement "
+            "ORDER BY session_id, step_order"
+        ))
         
-        df = pd.DataFrame(transition_data)
-        return df
+        for rows in result.partitions(TRANSITION_BATCH_SIZE):
+            n_movements += len(rows)
+            batch = pd.DataFrame(rows, columns=columns)
+            
+            # Prepend the previous batch's last row so transitions across
+            # the batch boundary are counted
+            if carry is not None:
+                batch = pd.concat([carry, batch], ignore_index=True)
+            
+            partial_counts.append(count_transitions(batch))
+            carry = batch.iloc[[-1]]
+    
+    logger.info(f"Processed {n_movements} movement records")
+    
+    if not partial_counts:
+        return pd.DataFrame(columns=['src_section_id', 'dst_section_id', 'count'])
+    
+    transitions = (
+        pd.concat(partial_counts, ignore_index=True)
+        .groupby(['src_section_id', 'dst_section_id'], sort=False)['count']
+        .sum()
+        .reset_index()
+    )
+    
+    logger.info(f"Found {len(transitions)} unique transitions")
+    
+    return transitions
 
 
-def build_networkx_graph(transitions_df: pd.DataFrame) -> nx.DiGraph:
+def build_networkx_graph(transitions_df: pd.DataFrame, keep_self_loops: bool = True) -> nx.DiGraph:
     """Build NetworkX directed graph from transitions.
     
     Args:
         transitions_df: DataFrame with src_section_id, dst_section_id, count
+        keep_self_loops: If False, drop rows whose source and destination match
     
     Returns:
         NetworkX DiGraph with edge weights
     """
+    import networkx as nx
+    
     logger.info("Building NetworkX graph...")
     
-    G = nx.DiGraph()
+    # Drop (X, X) rows with one vectorized comparison before graph construction
+    if not keep_self_loops:
+        src = transitions_df['src_section_id'].to_numpy()
+        transitions_df = transitions_df[src != transitions_df['dst_section_id'].to_numpy()]
+    
+    # Nothing to aggregate; skip the groupby and edge-list conversion
+    if transitions_df.empty:
+        logger.info("✓ Graph built: 0 nodes, 0 edges")
+        return nx.DiGraph()
     
-    # Add edges with weights
-    for _, row in transitions_df.iterrows():
-        G.add_edge(
-            row['src_section_id'],
-            row['dst_section_id'],
-            weight=row['count']
+    # Sum repeated (src, dst) rows; from_pandas_edgelist would keep only the last
+    edges = (
+        transitions_df
+        .groupby(['src_section_id', 'dst_section_id'], sort=False, as_index=False)['count']
+        .sum()
+        .rename(columns={'count': 'weight'})
+    )
+    
+    # Add edges with weights in one pass over the columns, on the GPU when
+    # USE_CUGRAPH is set and nx-cugraph is installed
+    edgelist_kwargs = dict(
+        source='src_section_id',
+        target='dst_section_id',
+        edge_attr='weight',
+        create_using=nx.DiGraph
+    )
+    try:
+        G = nx.from_pandas_edgelist(
+            edges, backend='cugraph' if Config.USE_CUGRAPH else None, **edgelist_kwargs
         )
+    except (ImportError, NotImplementedError, nx.NetworkXNotImplemented):
+        G = nx.from_pandas_edgelist(edges, **edgelist_kwargs)
     
     logger.info(f"✓ Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     
     return G
 
 
-def save_graph_to_db(transitions_df: pd.DataFrame) -> int:
+def build_networkx_graph_from_path(
+    path: Union[str, Path],
+    keep_self_loops: bool = True
+) -> nx.DiGraph:
+    """Build NetworkX directed graph from a transitions file on disk.
+    
+    Rows are summed per (src, dst) one batch at a time and merged into a
+    running total, so memory grows with the number of distinct edges rather
+    than the number of rows. With pyarrow installed batches come from an
+    Arrow dataset scan; otherwise CSVs are read with pandas in chunks of
+    TRANSITION_FILE_CHUNK_ROWS. The pandas fallback reads Parquet in one go.
+    
+    Args:
+        path: CSV file (any ".csv" suffix, case-insensitive, optionally
+            compressed, e.g. "transitions.csv.gz"), or Parquet file/directory,
+            with src_section_id, dst_section_id, count columns
+        keep_self_loops: If False, drop rows whose source and destination match
+    
+    Returns:
+        NetworkX DiGraph with edge weights
+    """
+    import pandas as pd
+    
+    path = Path(path)
+    columns = ['src_section_id', 'dst_section_id', 'count']
+    is_csv = '.csv' in [suffix.lower() for suffix in path.suffixes]
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        
+        def sum_by_edge(table: pa.Table) -> pa.Table:
+            summed = table.group_by(columns[:2]).aggregate([('count', 'sum')])
+            return summed.select(columns[:2] + ['count_sum']).rename_columns(columns)
+        
+        dataset = ds.dataset(path, format='csv' if is_csv else 'parquet')
+        totals = None
+        for batch in dataset.to_batches(columns=columns):
+            partial = sum_by_edge(pa.Table.from_batches([batch]))
+            totals = partial if totals is None else sum_by_edge(pa.concat_tables([totals, partial]))
+        
+        transitions_df = totals.to_pandas() if totals is not None else None
+    except ImportError:
+        logger.info("pyarrow not available, reading transitions with pandas")
+        if is_csv:
+            # Compression is inferred from the file extension
+            chunks = pd.read_csv(path, usecols=columns, chunksize=TRANSITION_FILE_CHUNK_ROWS)
+        else:
+            chunks = [pd.read_parquet(path, columns=columns)]
+        
+        transitions_df = None
+        for chunk in chunks:
+            if transitions_df is not None:
+                chunk = pd.concat([transitions_df, chunk], ignore_index=True)
+            transitions_df = chunk.groupby(columns[:2], sort=False, as_index=False)['count'].sum()
+    
+    if transitions_df is None:
+        transitions_df = pd.DataFrame(columns=columns)
+    
+    return build_networkx_graph(transitions_df, keep_self_loops=keep_self_loops)
+
+
+def build_csr_graph(
+    transitions_df: pd.DataFrame,
+    keep_self_loops: bool = True
+) -> Tuple[csr_matrix, np.ndarray]:
+    """Build a CSR adjacency matrix from transitions.
+    
+    Section ids are numbered in order of first appearance (source before
+    destination, row by row), matching NetworkX's node order for the same
+    DataFrame. Repeated (src, dst) rows are summed by the CSR conversion.
+    
+    Args:
+        transitions_df: DataFrame with src_section_id, dst_section_id, count
+        keep_self_loops: If False, drop rows whose source and destination match
+    
+    Returns:
+        Tuple of (n x n int32 CSR matrix of edge weights, section ids by node index)
+    """
+    import numpy as np
+    import pandas as pd
+    from scipy.sparse import coo_matrix
+    
+    logger.info("Building CSR graph...")
+    
+    # Drop (X, X) rows with one vectorized comparison before graph construction
+    if not keep_self_loops:
+        src = transitions_df['src_section_id'].to_numpy()
+        transitions_df = transitions_df[src != transitions_df['dst_section_id'].to_numpy()]
+    
+    # Interleave endpoints so codes follow first appearance like from_pandas_edgelist
+    endpoints = np.column_stack([
+        transitions_df['src_section_id'].to_numpy(dtype=object),
+        transitions_df['dst_section_id'].to_numpy(dtype=object),
+    ]).ravel()
+    codes, section_ids = pd.factorize(endpoints)
+    codes = codes.astype(np.int32).reshape(-1, 2)
+    n = len(section_ids)
+    
+    # Transition counts are integers; int32 weights take 4 bytes per edge
+    adjacency = coo_matrix(
+        (transitions_df['count'].to_numpy(dtype=np.int32), (codes[:, 0], codes[:, 1])),
+        shape=(n, n)
+    ).tocsr()
+    
+    logger.info(f"✓ Graph built: {n} nodes, {adjacency.nnz} edges")
+    
+    return adjacency, np.asarray(section_ids)
+
+
+def save_graph_to_db(transitions_df: pd.DataFrame, incremental: bool = False) -> int:
     """Save graph edges to database.
     
     Args:
         transitions_df: DataFrame with src_section_id, dst_section_id, count
+        incremental: If True, upsert edge weights and keep edges missing from
+            transitions_df; otherwise replace the whole table
     
     Returns:
         int: Number of edges saved
     """
     logger.info("Saving graph edges to database...")
     
+    records = (
+        transitions_df[['src_section_id', 'dst_section_id', 'count']]
+        .rename(columns={'count': 'weight'})
+        .astype({'weight': float})
+        .to_dict(orient='records')
+    )
+    
     with session_scope() as session:
-        # Delete existing edges
-        deleted = session.query(GraphEdge).delete()
-        logger.info(f"Deleted {deleted} existing edges")
-        
-        # Insert new edges
-        edges = [
-            GraphEdge(
-                src_section_id=row['src_section_id'],
-                dst_section_id=row['dst_section_id'],
-                weight=float(row['count'])
-            )
-            for _, row in transitions_df.iterrows()
-        ]
+        if incremental:
+            # Insert new edges and update weights of existing ones in one statement
+            if records:
+                stmt = mysql_insert(GraphEdge).values(records)
+                stmt = stmt.on_duplicate_key_update(weight=stmt.inserted.weight)
+                session.execute(stmt)
+        else:
+            session.execute(delete(GraphEdge))
+            logger.info("Cleared existing edges")
+            
+            # Insert new edges (single executemany, no ORM objects)
+            if records:
+                session.execute(GraphEdge.__table__.insert(), records)
         
-        session.bulk_save_objects(edges)
         session.commit()
     
-    logger.info(f"✓ Saved {len(edges)} edges to database")
-    return len(edges)
+    clear_cache()
+    logger.info(f"✓ Saved {len(records)} edges to database")
+    return len(records)
 
 
 def get_graph_statistics(G: nx.DiGraph) -> Dict:
@@ -130,40 +326,82 @@ def get_graph_statistics(G: nx.DiGraph) -> Dict:
     Returns:
         Dictionary with statistics
     """
+    # Single pass over the degree view; every edge adds 2 to the degree sum
+    # (self-loops included), so edges and density come from the same pass
+    degree_items = list(G.degree())
+    n_nodes = len(degree_items)
+    n_edges = sum(d for _, d in degree_items) // 2
+    
+    # Directed density counts ordered pairs, undirected density unordered ones
+    n_pairs = n_nodes * (n_nodes - 1) if G.is_directed() else n_nodes * (n_nodes - 1) / 2
+    
     stats = {
-        'nodes': G.number_of_nodes(),
-        'edges': G.number_of_edges(),
-        'avg_degree': sum(dict(G.degree()).values()) / G.number_of_nodes() if G.number_of_nodes() > 0 else 0,
-        'density': nx.density(G),
+        'nodes': n_nodes,
+        'edges': n_edges,
+        'avg_degree': 2 * n_edges / n_nodes if n_nodes > 0 else 0,
+        'density': n_edges / n_pairs if n_nodes > 1 else 0,
     }
     
     # Top 5 most connected nodes
-    degree_dict = dict(G.degree())
-    top_nodes = sorted(degree_dict.items(), key=lambda x: x[1], reverse=True)[:5]
-    stats['top_nodes'] = top_nodes
+    stats['top_nodes'] = heapq.nlargest(5, degree_items, key=lambda x: x[1])
+    
+    return stats
+
+
+def get_csr_graph_statistics(adjacency: csr_matrix, section_ids: np.ndarray) -> Dict:
+    """Compute basic graph statistics from a CSR adjacency matrix.
+    
+    Gives the same values as get_graph_statistics on the equivalent DiGraph.
+    
+    Args:
+        adjacency: n x n CSR matrix from build_csr_graph
+        section_ids: Section ids by node index
+    
+    Returns:
+        Dictionary with statistics
+    """
+    import numpy as np
+    
+    n_nodes = adjacency.shape[0]
+    n_edges = adjacency.nnz
+    
+    # Out-degree from the row pointers, in-degree from the column indices
+    degrees = np.diff(adjacency.indptr) + np.bincount(adjacency.indices, minlength=n_nodes)
+    
+    stats = {
+        'nodes': n_nodes,
+        'edges': n_edges,
+        'avg_degree': 2 * n_edges / n_nodes if n_nodes > 0 else 0,
+        'density': n_edges / (n_nodes * (n_nodes - 1)) if n_nodes > 1 else 0,
+    }
+    
+    # Top 5 most connected nodes (stable, so ties keep node order)
+    top = np.argsort(-degrees, kind='stable')[:5]
+    stats['top_nodes'] = [(section_ids[i], int(degrees[i])) for i in top]
     
     return stats
 
 
-def build_movement_graph() -> Tuple[nx.DiGraph, pd.DataFrame]:
+def build_movement_graph() -> Tuple[csr_matrix, np.ndarray, pd.DataFrame]:
     """Main function to build movement graph.
     
     Returns:
-        Tuple of (NetworkX graph, transitions DataFrame)
+        Tuple of (CSR adjacency matrix, section ids by node index,
+        transitions DataFrame)
     """
     logger.info("Starting graph building process...")
     
     # Compute transitions
     transitions_df = compute_transitions_from_db()
     
-    # Build NetworkX graph
-    G = build_networkx_graph(transitions_df)
+    # Build CSR graph (use build_networkx_graph for a NetworkX view)
+    adjacency, section_ids = build_csr_graph(transitions_df)
     
     # Save to database
     save_graph_to_db(transitions_df)
     
     # Log statistics
-    stats = get_graph_statistics(G)
+    stats = get_csr_graph_statistics(adjacency, section_ids)
     logger.info("Graph statistics:")
     logger.info(f"  Nodes: {stats['nodes']}")
     logger.info(f"  Edges: {stats['edges']}")
@@ -173,7 +411,7 @@ def build_movement_graph() -> Tuple[nx.DiGraph, pd.DataFrame]:
     
     logger.info("✓ Graph building complete!")
     
-    return G, transitions_df
+    return adjacency, section_ids, transitions_df
 
 
 if __name__ == '__main__':
@@ -1,9 +1,13 @@
 """Detect communities in the section graph using modularity optimization."""
 import networkx as nx
+import numpy as np
+import hashlib
 import logging
-from typing import Dict, List
-from collections import defaultdict
+from sqlalchemy import delete, select, func
+from typing import Dict, List, Literal
+from collections import OrderedDict, defaultdict
 
+from app.cache import clear_cache
 from app.db import session_scope
 from app.models import GraphEdge, SectionCommunity
 from app.pipeline.build_graph import build_movement_graph
@@ -11,6 +15,33 @@ from app.pipeline.build_graph import build_movement_graph
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+Algorithm = Literal['louvain', 'leiden', 'fastgreedy']
+
+# Greedy modularity partitions keyed by graph fingerprint, so repeated runs on
+# an identical graph in the same process skip the O(k*n*d) search; least
+# recently used entries are evicted beyond GREEDY_CACHE_SIZE
+GREEDY_CACHE: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+GREEDY_CACHE_SIZE = 32
+
+
+def load_edge_weights(session) -> List:
+    """Fetch undirected (a, b, weight) rows with both directions summed in SQL.
+    
+    Each edge is keyed by its (LEAST, GREATEST) endpoint pair, so A->B and
+    B->A collapse into a single row.
+    
+    Args:
+        session: Active database session
+    
+    Returns:
+        List of (section_id, section_id, weight) rows, one per undirected edge
+    """
+    a = func.least(GraphEdge.src_section_id, GraphEdge.dst_section_id).label('a')
+    b = func.greatest(GraphEdge.src_section_id, GraphEdge.dst_section_id).label('b')
+    
+    stmt = select(a, b, func.sum(GraphEdge.weight)).group_by(a, b)
+    return [(a, b, float(weight)) for a, b, weight in session.execute(stmt)]
+
 
 def load_graph_from_db() -> nx.Graph:
     """Load graph from database as undirected graph for community detection.
@@ -23,32 +54,129 @@ def load_graph_from_db() -> nx.Graph:
     G = nx.Graph()  # Undirected for community detection
     
     with session_scope() as session:
-        edges = session.query(GraphEdge).all()
-        
-        for edge in edges:
-            # Add edge (combine weights if both directions exist)
-            if G.has_edge(edge.src_section_id, edge.dst_section_id):
-                G[edge.src_section_id][edge.dst_section_id]['weight'] += edge.weight
-            else:
-                G.add_edge(
-                    edge.src_section_id,
-                    edge.dst_section_id,
-                    weight=edge.weight
-                )
+        # Both directions are already combined by the query
+        G.add_weighted_edges_from(load_edge_weights(session))
     
     logger.info(f"✓ Loaded graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     return G
 
 
+def load_igraph_from_db():
+    """Load graph from database straight into an undirected igraph Graph.
+    
+    Skips NetworkX entirely; both directions of an edge are already merged
+    by the query. Section ids are kept in the 'name' vertex attribute.
+    
+    Returns:
+        igraph undirected Graph
+    
+    Raises:
+        ImportError: If python-igraph is not installed
+    """
+    import igraph as ig
+    logger.info("Loading graph from database into igraph...")
+    
+    with session_scope() as session:
+        rows = load_edge_weights(session)
+    
+    graph = ig.Graph.TupleList(rows, directed=False, weights=True)
+    
+    logger.info(f"✓ Loaded graph: {graph.vcount()} nodes, {graph.ecount()} edges")
+    return graph
+
+
+def igraph_partition(graph, algorithm: Algorithm = 'louvain') -> Dict[str, int]:
+    """Run igraph Louvain or Leiden on a graph with named vertices.
+    
+    Leiden adds a refinement phase that guarantees connected communities,
+    which Louvain does not. Fastgreedy is the Clauset-Newman-Moore greedy
+    modularity algorithm, cut at the level with the highest modularity.
+    
+    Args:
+        graph: igraph undirected Graph with 'name' and 'weight' attributes
+        algorithm: 'louvain' (multilevel), 'leiden' (modularity objective)
+            or 'fastgreedy'
+    
+    Returns:
+        Dictionary mapping section_id to community_id
+    """
+    if algorithm == 'fastgreedy':
+        logger.info("Using igraph fastgreedy for community detection...")
+        clustering = graph.community_fastgreedy(weights='weight').as_clustering()
+    elif algorithm == 'leiden':
+        logger.info("Using igraph Leiden for community detection...")
+        clustering = graph.community_leiden(
+            objective_function='modularity', weights='weight'
+        )
+    else:
+        logger.info("Using igraph multilevel (Louvain) for community detection...")
+        clustering = graph.community_multilevel(weights='weight')
+    membership = clustering.membership
+    
+    logger.info(f"✓ igraph {algorithm.capitalize()} found {len(set(membership))} communities")
+    return dict(zip(graph.vs['name'], membership))
+
+
+def networkx_to_igraph(G: nx.Graph):
+    """Convert a NetworkX undirected graph to igraph.
+    
+    Args:
+        G: NetworkX undirected graph
+    
+    Returns:
+        igraph undirected Graph with 'name' and 'weight' attributes
+    
+    Raises:
+        ImportError: If python-igraph is not installed
+    """
+    import igraph as ig
+    
+    # Index nodes once so igraph works on integer vertex ids
+    nodes = list(G.nodes())
+    node_idx = {node: i for i, node in enumerate(nodes)}
+    edges = [(node_idx[u], node_idx[v]) for u, v in G.edges()]
+    weights = [w for _, _, w in G.edges(data='weight', default=1)]
+    
+    return ig.Graph(
+        n=len(nodes),
+        edges=edges,
+        vertex_attrs={'name': nodes},
+        edge_attrs={'weight': weights}
+    )
+
+
+def detect_communities_igraph(G: nx.Graph) -> Dict[str, int]:
+    """Detect communities using igraph's C implementation of Louvain.
+    
+    Args:
+        G: NetworkX undirected graph
+    
+    Returns:
+        Dictionary mapping section_id to community_id
+    
+    Raises:
+        ImportError: If python-igraph is not installed
+    """
+    return igraph_partition(networkx_to_igraph(G))
+
+
 def detect_communities_louvain(G: nx.Graph) -> Dict[str, int]:
     """Detect communities using Louvain algorithm.
     
+    Prefers igraph's C implementation and falls back to python-louvain,
+    then to NetworkX greedy modularity.
+    
     Args:
         G: NetworkX undirected graph
     
     Returns:
         Dictionary mapping section_id to community_id
     """
+    try:
+        return detect_communities_igraph(G)
+    except ImportError:
+        logger.info("python-igraph not available, trying python-louvain")
+    
     try:
         import community as community_louvain
         logger.info("Using Louvain algorithm for community detection...")
@@ -64,9 +192,42 @@ def detect_communities_louvain(G: nx.Graph) -> Dict[str, int]:
         return detect_communities_greedy(G)
 
 
+def graph_fingerprint(G: nx.Graph) -> str:
+    """Hash an undirected graph's nodes and weighted edges.
+    
+    Args:
+        G: NetworkX undirected graph
+    
+    Returns:
+        Hex digest that is equal for graphs with the same nodes and weights
+    """
+    # repr keeps node types apart, so 1 and '1' hash differently
+    nodes = sorted(map(repr, G.nodes))
+    edges = sorted(
+        (*sorted((repr(u), repr(v))), float(w))
+        for u, v, w in G.edges(data='weight', default=1)
+    )
+    return hashlib.blake2b(repr((nodes, edges)).encode(), digest_size=16).hexdigest()
+
+
+def cache_greedy_partition(fingerprint: str, partition: Dict[str, int]):
+    """Store a partition in GREEDY_CACHE, evicting the least recently used.
+    
+    Args:
+        fingerprint: Key from graph_fingerprint
+        partition: Dictionary mapping section_id to community_id
+    """
+    GREEDY_CACHE[fingerprint] = dict(partition)
+    GREEDY_CACHE.move_to_end(fingerprint)
+    while len(GREEDY_CACHE) > GREEDY_CACHE_SIZE:
+        GREEDY_CACHE.popitem(last=False)
+
+
 def detect_communities_greedy(G: nx.Graph) -> Dict[str, int]:
     """Detect communities using NetworkX greedy modularity algorithm.
     
+    Results are cached in GREEDY_CACHE by graph fingerprint.
+    
     Args:
         G: NetworkX undirected graph
     
@@ -75,8 +236,27 @@ def detect_communities_greedy(G: nx.Graph) -> Dict[str, int]:
     """
     logger.info("Using greedy modularity algorithm for community detection...")
     
-    # Greedy modularity communities
-    communities = nx.community.greedy_modularity_communities(G, weight='weight')
+    fingerprint = graph_fingerprint(G)
+    if fingerprint in GREEDY_CACHE:
+        logger.info("✓ Reusing cached greedy modularity partition")
+        GREEDY_CACHE.move_to_end(fingerprint)
+        return dict(GREEDY_CACHE[fingerprint])
+    
+    # Same algorithm in igraph's C implementation when available
+    try:
+        partition = igraph_partition(networkx_to_igraph(G), algorithm='fastgreedy')
+        cache_greedy_partition(fingerprint, partition)
+        return partition
+    except ImportError:
+        logger.info("python-igraph not available, using NetworkX greedy modularity")
+    
+    # Greedy modularity communities, on the GPU when nx-cugraph is installed
+    try:
+        communities = nx.community.greedy_modularity_communities(
+            G, weight='weight', backend='cugraph'
+        )
+    except (ImportError, NotImplementedError, nx.NetworkXNotImplemented):
+        communities = nx.community.greedy_modularity_communities(G, weight='weight')
     
     # Convert to partition dictionary
     partition = {}
@@ -84,6 +264,7 @@ def detect_communities_greedy(G: nx.Graph) -> Dict[str, int]:
         for node in community_nodes:
             partition[node] = community_id
     
+    cache_greedy_partition(fingerprint, partition)
     logger.info(f"✓ Greedy modularity found {len(communities)} communities")
     return partition
 
@@ -99,23 +280,22 @@ def save_communities_to_db(partition: Dict[str, int]) -> int:
     """
     logger.info("Saving community assignments to database...")
     
+    assignments = [
+        {'section_id': section_id, 'community_id': int(community_id)}
+        for section_id, community_id in partition.items()
+    ]
+    
     with session_scope() as session:
-        # Delete existing assignments
-        deleted = session.query(SectionCommunity).delete()
-        logger.info(f"Deleted {deleted} existing community assignments")
+        # Cleared in the same transaction as the insert, so readers never see it empty
+        session.execute(delete(SectionCommunity))
+        logger.info("Cleared existing community assignments")
         
-        # Insert new assignments
-        assignments = [
-            SectionCommunity(
-                section_id=section_id,
-                community_id=community_id
-            )
-            for section_id, community_id in partition.items()
-        ]
-        
-        session.bulk_save_objects(assignments)
+        # Insert new assignments (single executemany, no ORM objects)
+        if assignments:
+            session.execute(SectionCommunity.__table__.insert(), assignments)
         session.commit()
     
+    clear_cache()
     logger.info(f"✓ Saved {len(assignments)} community assignments")
     return len(assignments)
 
@@ -129,41 +309,48 @@ def get_community_statistics(partition: Dict[str, int]) -> Dict:
     Returns:
         Dictionary with statistics
     """
-    # Count sections per community
-    community_sizes = defaultdict(int)
-    for section_id, community_id in partition.items():
-        community_sizes[community_id] += 1
+    # Count sections per community in one pass (community ids are non-negative)
+    ids = np.fromiter(partition.values(), dtype=np.int64, count=len(partition))
+    counts = np.bincount(ids)
+    community_ids = np.flatnonzero(counts)
+    sizes = counts[community_ids]
     
     stats = {
-        'num_communities': len(community_sizes),
-        'community_sizes': dict(community_sizes),
-        'avg_size': sum(community_sizes.values()) / len(community_sizes) if community_sizes else 0,
-        'largest_community': max(community_sizes.values()) if community_sizes else 0,
-        'smallest_community': min(community_sizes.values()) if community_sizes else 0
+        'num_communities': len(sizes),
+        'community_sizes': dict(zip(community_ids.tolist(), sizes.tolist())),
+        'avg_size': float(sizes.mean()) if len(sizes) else 0,
+        'largest_community': int(sizes.max()) if len(sizes) else 0,
+        'smallest_community': int(sizes.min()) if len(sizes) else 0
     }
     
     return stats
 
 
-def detect_section_communities(use_louvain: bool = True) -> Dict[str, int]:
+def detect_section_communities(
+    use_louvain: bool = True,
+    algorithm: Algorithm = 'leiden'
+) -> Dict[str, int]:
     """Main function to detect section communities.
     
     Args:
-        use_louvain: If True, try Louvain algorithm first
+        use_louvain: If True, use modularity optimization via igraph (or
+            python-louvain); if False, use NetworkX greedy modularity
+        algorithm: igraph algorithm, 'leiden' or 'louvain'; without igraph
+            both fall back to python-louvain
     
     Returns:
         Dictionary mapping section_id to community_id
     """
     logger.info("Starting community detection...")
     
-    # Load graph
-    G = load_graph_from_db()
-    
-    # Detect communities
+    # Load graph and detect communities; igraph path avoids NetworkX
     if use_louvain:
-        partition = detect_communities_louvain(G)
+        try:
+            partition = igraph_partition(load_igraph_from_db(), algorithm)
+        except ImportError:
+            partition = detect_communities_louvain(load_graph_from_db())
     else:
-        partition = detect_communities_greedy(G)
+        partition = detect_communities_greedy(load_graph_from_db())
     
     # Save to database
     save_communities_to_db(partition)
@@ -177,9 +364,13 @@ def detect_section_communities(use_louvain: bool = True) -> Dict[str, int]:
     logger.info(f"  Smallest community: {stats['smallest_community']} sections")
     
     # Show community breakdown
+    members_by_comm = defaultdict(list)
+    for section_id, community_id in partition.items():
+        members_by_comm[community_id].append(section_id)
+    
     logger.info("Community breakdown:")
     for comm_id, size in sorted(stats['community_sizes'].items()):
-        members = [s for s, c in partition.items() if c == comm_id]
+        members = members_by_comm[comm_id]
         logger.info(f"  Community {comm_id}: {size} sections - {', '.join(sorted(members)[:10])}")
     
     logger.info("✓ Community detection complete!")
@@ -1,9 +1,12 @@
 """Load CSV data into MySQL database."""
 import pandas as pd
+from itertools import chain
 from pathlib import Path
 import logging
-from typing import Optional
+from typing import Iterable, List, Optional
+from sqlalchemy import text
 
+from app.cache import MOVEMENT_VERSION, bump_data_version, clear_cache
 from app.db import session_scope
 from app.models import Movement, Product
 from app.config import Config
@@ -11,6 +14,25 @@ from app.config import Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per multi-row INSERT; keeps each statement well under MySQL's
+# default max_allowed_packet (64MB)
+INSERT_BATCH_SIZE = 5000
+
+# Column dtypes for customer path CSVs (timestamp is parsed separately)
+PATHS_DTYPES = {
+    'session_id': 'string',
+    'step_order': 'int32',
+    'section_id': 'string'
+}
+
+# CSV header -> movement column for LOAD DATA; unknown fields are skipped
+PATHS_CSV_COLUMNS = {
+    'session_id': 'session_id',
+    'step_order': 'step_order',
+    'section_id': 'section_id',
+    'timestamp': 'ts'
+}
+
 
 def validate_paths_df(df: pd.DataFrame) -> bool:
     """Validate customer paths DataFrame schema.
@@ -63,6 +85,70 @@ def validate_products_df(df: pd.DataFrame) -> bool:
     return True
 
 
+def load_data_infile(session, table_name: str, csv_path: Path, columns: List[str]) -> int:
+    """Bulk load a CSV file with MySQL LOAD DATA LOCAL INFILE.
+    
+    The server parses the file directly, skipping per-row INSERT statements.
+    Requires MYSQL_LOCAL_INFILE=True and local_infile=ON on the server.
+    
+    Args:
+        session: Active database session
+        table_name: Target table
+        csv_path: CSV file with a header row
+        columns: Target column (or @user variable) for each CSV field, in order
+    
+    Returns:
+        int: Number of rows loaded
+    """
+    # Match the file's line endings so CRLF files don't leave '\r' in the last column
+    with open(csv_path, 'rb') as f:
+        line_end = '\\r\\n' if f.readline().endswith(b'\r\n') else '\\n'
+    
+    stmt = text(
+        f"LOAD DATA LOCAL INFILE :csv_path INTO TABLE {table_name} "
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+        f"LINES TERMINATED BY '{line_end}' IGNORE 1 LINES "
+        f"({', '.join(columns)})"
+    )
+    result = session.execute(stmt, {'csv_path': str(Path(csv_path).resolve())})
+    return result.rowcount
+
+
+def insert_movement_chunks(session, chunks: Iterable[pd.DataFrame]) -> int:
+    """Insert path DataFrame chunks as multi-row INSERT batches.
+    
+    Args:
+        session: Active database session
+        chunks: DataFrames with session_id, step_order, section_id, timestamp
+    
+    Returns:
+        int: Number of records inserted
+    """
+    batch_size = INSERT_BATCH_SIZE
+    records_inserted = 0
+    batches = 0
+    
+    for chunk in chunks:
+        # Convert timestamp to datetime
+        chunk['timestamp'] = pd.to_datetime(chunk['timestamp'])
+        
+        records = chunk[['session_id', 'step_order', 'section_id', 'timestamp']].rename(
+            columns={'timestamp': 'ts'}
+        )
+        
+        for i in range(0, len(records), batch_size):
+            batch = records.iloc[i:i+batch_size].to_dict('records')
+            
+            session.execute(Movement.__table__.insert(), batch)
+            records_inserted += len(batch)
+            batches += 1
+            
+            if batches % 10 == 0:
+                logger.info(f"  Inserted {records_inserted} records...")
+    
+    return records_inserted
+
+
 def load_paths_to_db(
     csv_path: Optional[Path] = None,
     df: Optional[pd.DataFrame] = None,
@@ -82,14 +168,23 @@ def load_paths_to_db(
         if csv_path is None:
             csv_path = Config.DATA_DIR / 'sample_paths.csv'
         
+        # Stream the file in insert-sized chunks instead of loading it whole
         logger.info(f"Loading paths from {csv_path}...")
-        df = pd.read_csv(csv_path)
+        chunks = pd.read_csv(
+            csv_path,
+            chunksize=INSERT_BATCH_SIZE,
+            dtype=PATHS_DTYPES,
+            parse_dates=['timestamp']
+        )
+    else:
+        chunks = [df]
     
-    # Validate
-    validate_paths_df(df)
+    use_infile = df is None and Config.MYSQL_LOCAL_INFILE
     
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Validate (dtypes are fixed, so the first chunk covers the schema)
+    chunks = iter(chunks)
+    first_chunk = next(chunks)
+    validate_paths_df(first_chunk)
     
     with session_scope() as session:
         # Clear existing if requested
@@ -97,31 +192,20 @@ def load_paths_to_db(
             deleted = session.query(Movement).delete()
             logger.info(f"Deleted {deleted} existing movement records")
         
-        # Insert records in batches
-        batch_size = 1000
-        records_inserted = 0
-        
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-            
-            movements = [
-                Movement(
-                    session_id=row['session_id'],
-                    step_order=row['step_order'],
-                    section_id=row['section_id'],
-                    ts=row['timestamp']
-                )
-                for _, row in batch.iterrows()
-            ]
-            
-            session.bulk_save_objects(movements)
-            records_inserted += len(movements)
-            
-            if (i // batch_size + 1) % 5 == 0:
-                logger.info(f"  Inserted {records_inserted}/{len(df)} records...")
+        if use_infile:
+            # Fast path: let MySQL parse the file itself
+            columns = [PATHS_CSV_COLUMNS.get(col, '@unused') for col in first_chunk.columns]
+            records_inserted = load_data_infile(
+                session, Movement.__tablename__, csv_path, columns
+            )
+        else:
+            records_inserted = insert_movement_chunks(session, chain([first_chunk], chunks))
         
         session.commit()
     
+    # New movement data invalidates the cached co-occurrence matrix
+    bump_data_version(MOVEMENT_VERSION)
+    clear_cache()
     logger.info(f"✓ Loaded {records_inserted} movement records to database")
     return records_inserted
 
@@ -158,18 +242,12 @@ def load_products_to_db(
             logger.info(f"Deleted {deleted} existing product records")
         
         # Insert records
-        products = [
-            Product(
-                name=row['name'],
-                category=row['category'],
-                current_section_id=row['current_section_id']
-            )
-            for _, row in df.iterrows()
-        ]
+        products = df[['name', 'category', 'current_section_id']].to_dict('records')
         
-        session.bulk_save_objects(products)
+        session.bulk_insert_mappings(Product, products)
         session.commit()
     
+    clear_cache()
     logger.info(f"✓ Loaded {len(products)} products to database")
     return len(products)
 
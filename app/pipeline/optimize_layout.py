@@ -1,11 +1,14 @@
 """Optimize product-to-section layout using linear assignment."""
 import numpy as np
 from scipy.optimize import linear_sum_assignment
+from sqlalchemy import delete
 import logging
 from typing import Dict, Tuple, List
+from collections import defaultdict
 
+from app.cache import clear_cache
 from app.db import session_scope
-from app.models import StoreSection, Product, GraphEdge, ProductCluster, Recommendation
+from app.models import StoreSection, Product, ProductCluster, Recommendation
 from app.config import Config
 
 logging.basicConfig(level=logging.INFO)
@@ -13,9 +16,9 @@ logger = logging.getLogger(__name__)
 
 np.random.seed(Config.RANDOM_SEED)
 
-
-def manhattan_distance(x1: int, y1: int, x2: int, y2: int) -> int:
-    return abs(x1 - x2) + abs(y1 - y2)
+# Flow between two clustered products
+SAME_CLUSTER_FLOW = 10.0
+CROSS_CLUSTER_FLOW = 0.1
 
 
 # -----------------------------------------------------------
@@ -51,9 +54,6 @@ def load_sections_and_products() -> Tuple[List, List, Dict, Dict]:
             for p in db_products
         ]
 
-        # Section coords dict
-        section_coords = {s["section_id"]: (s["x"], s["y"]) for s in sections}
-
         # Product info dict
         product_info = {
             p["product_id"]: {
@@ -70,77 +70,81 @@ def load_sections_and_products() -> Tuple[List, List, Dict, Dict]:
             if c.product_id in product_info:
                 product_info[c.product_id]["cluster_id"] = c.cluster_id
 
-        logger.info(f"✓ Loaded {len(sections)} sections and {len(products)} products")
-        return sections, products, section_coords, product_info
-
-
-def build_flow_matrix(products: List, product_info: Dict) -> np.ndarray:
-    logger.info("Building product flow matrix...")
-
-    n_products = len(products)
-    flow = np.zeros((n_products, n_products))
+        arrays = build_index_arrays(sections, products, product_info)
 
-    for i, p1 in enumerate(products):
-        cluster1 = product_info[p1["product_id"]]["cluster_id"]
-        if cluster1 is None:
-            continue
-
-        for j, p2 in enumerate(products):
-            if i >= j:
-                continue
-
-            cluster2 = product_info[p2["product_id"]]["cluster_id"]
-            if cluster2 is None:
-                continue
-
-            if cluster1 == cluster2:
-                flow[i, j] = flow[j, i] = 10.0
-            else:
-                flow[i, j] = flow[j, i] = 0.1
-
-    logger.info(f"✓ Flow matrix built: {n_products}x{n_products}")
-    return flow
+        logger.info(f"✓ Loaded {len(sections)} sections and {len(products)} products")
+        return sections, products, product_info, arrays
 
 
-def build_distance_matrix(sections: List, section_coords: Dict) -> np.ndarray:
+def build_index_arrays(sections: List, products: List, product_info: Dict) -> Dict:
+    """Structure-of-arrays views, indexed by position, for the matrix builders."""
+    section_idx = {s["section_id"]: idx for idx, s in enumerate(sections)}
+    cluster_ids = [product_info[p["product_id"]]["cluster_id"] for p in products]
+
+    return {
+        "xs": np.array([s["x"] for s in sections], dtype=np.int32),
+        "ys": np.array([s["y"] for s in sections], dtype=np.int32),
+        # Index of each product's current section; -1 if unknown
+        "cur_idx": np.array(
+            [section_idx.get(p["current_section_id"], -1) for p in products],
+            dtype=np.int32,
+        ),
+        # Cluster id per product; unclustered products get -1
+        "cluster_ids": np.array(
+            [-1 if cid is None else cid for cid in cluster_ids], dtype=np.int32
+        ),
+    }
+
+
+def build_distance_matrix(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
     logger.info("Building distance matrix...")
 
-    n_sections = len(sections)
-    distances = np.zeros((n_sections, n_sections))
+    n_sections = len(xs)
 
-    for i, s1 in enumerate(sections):
-        x1, y1 = section_coords[s1["section_id"]]
-        for j, s2 in enumerate(sections):
-            x2, y2 = section_coords[s2["section_id"]]
-            distances[i, j] = manhattan_distance(x1, y1, x2, y2)
+    # Pairwise Manhattan distances via broadcasting
+    distances = (
+        np.abs(xs[:, None] - xs[None, :]) + np.abs(ys[:, None] - ys[None, :])
+    ).astype(np.float64)
 
     logger.info(f"✓ Distance matrix built: {n_sections}x{n_sections}")
     return distances
 
 
-def build_cost_matrix(flow: np.ndarray, distances: np.ndarray, products: List, sections: List) -> np.ndarray:
-    logger.info("Building cost matrix for assignment...")
-
-    n_products = len(products)
-    n_sections = len(sections)
-    cost = np.zeros((n_products, n_sections))
+def build_cluster_cost_matrix(cids: np.ndarray, distances: np.ndarray, cur_idx: np.ndarray) -> np.ndarray:
+    """Cost matrix for the cluster flow model without materializing the flow matrix.
 
-    section_idx = {s["section_id"]: idx for idx, s in enumerate(sections)}
+    cost[i, j] = sum over k != i of flow(i, k) * distances[j, cur_idx[k]], where
+    the flow between clustered products is SAME_CLUSTER_FLOW within a cluster,
+    CROSS_CLUSTER_FLOW across clusters, and 0 for unclustered products or
+    products without a current section. Each clustered row is therefore
+    CROSS * total + (SAME - CROSS) * cluster_total - SAME * own distance,
+    where the totals sum distances to current sections over clustered products,
+    computed in O(n_products * n_sections) time and memory.
+    """
+    logger.info("Building cost matrix for assignment...")
 
-    for i in range(n_products):
-        for j in range(n_sections):
-            total_cost = 0.0
+    n_products = len(cids)
+    n_sections = len(distances)
+    clustered = cids != -1
+    valid = clustered & (cur_idx >= 0)
 
-            for k in range(n_products):
-                if i == k:
-                    continue
+    # Row k: distance from every section to product k's current section
+    d_cur = np.zeros((n_products, n_sections))
+    d_cur[valid] = distances[:, cur_idx[valid]].T
 
-                current_section = products[k]["current_section_id"]
-                if current_section and current_section in section_idx:
-                    k_idx = section_idx[current_section]
-                    total_cost += flow[i, k] * distances[j, k_idx]
+    # Column sums overall and per cluster
+    total = d_cur.sum(axis=0)
+    _, members = np.unique(cids[clustered], return_inverse=True)
+    cluster_totals = np.zeros((members.max() + 1 if members.size else 0, n_sections))
+    np.add.at(cluster_totals, members, d_cur[clustered])
 
-            cost[i, j] = total_cost
+    # Unclustered products have no flow, so their rows stay zero
+    cost = np.zeros((n_products, n_sections))
+    cost[clustered] = (
+        CROSS_CLUSTER_FLOW * total
+        + (SAME_CLUSTER_FLOW - CROSS_CLUSTER_FLOW) * cluster_totals[members]
+        - SAME_CLUSTER_FLOW * d_cur[clustered]
+    )
 
     logger.info(f"✓ Cost matrix built: {n_products}x{n_sections}")
     return cost
@@ -158,6 +162,13 @@ def generate_recommendations(products, sections, row_ind, col_ind, product_info,
     logger.info("Generating recommendations...")
     recommendations = []
 
+    # (product_id, name) of every product per cluster, in product order
+    cluster_members = defaultdict(list)
+    for p in products:
+        cid = product_info[p["product_id"]]["cluster_id"]
+        if cid is not None:
+            cluster_members[cid].append((p["product_id"], p["name"]))
+
     for i, j in zip(row_ind, col_ind):
         product = products[i]
         section = sections[j]
@@ -171,17 +182,18 @@ def generate_recommendations(products, sections, row_ind, col_ind, product_info,
         )
 
         if cluster_id is not None:
-            same_cluster = [
-                p for p in products
-                if product_info[p["product_id"]]["cluster_id"] == cluster_id
-                and p["product_id"] != product["product_id"]
-            ]
-
-            if same_cluster:
-                names = [p["name"] for p in same_cluster[:3]]
+            members = cluster_members[cluster_id]
+            # The product itself is one of the members
+            n_others = len(members) - 1
+
+            if n_others > 0:
+                names = [
+                    name for pid, name in members[:4]
+                    if pid != product["product_id"]
+                ][:3]
                 rationale_parts.append(
                     f"clustered with {', '.join(names)}"
-                    + (f" and {len(same_cluster)-3} others" if len(same_cluster) > 3 else "")
+                    + (f" and {n_others-3} others" if n_others > 3 else "")
                 )
 
         rationale_parts.append(
@@ -203,34 +215,36 @@ def generate_recommendations(products, sections, row_ind, col_ind, product_info,
 def save_recommendations_to_db(recommendations):
     logger.info("Saving recommendations to database...")
 
+    records = [
+        {
+            "product_id": r["product_id"],
+            "recommended_section_id": r["recommended_section_id"],
+            "rationale": r["rationale"],
+            "score": r["score"]
+        }
+        for r in recommendations
+    ]
+
     with session_scope() as session:
-        session.query(Recommendation).delete()
-
-        objs = [
-            Recommendation(
-                product_id=r["product_id"],
-                recommended_section_id=r["recommended_section_id"],
-                rationale=r["rationale"],
-                score=r["score"]
-            )
-            for r in recommendations
-        ]
+        session.execute(delete(Recommendation))
 
-        session.bulk_save_objects(objs)
+        # Single executemany, no ORM objects
+        if records:
+            session.execute(Recommendation.__table__.insert(), records)
         session.commit()
 
-    logger.info(f"✓ Saved {len(objs)} recommendations")
-    return len(objs)
+    clear_cache()
+    logger.info(f"✓ Saved {len(records)} recommendations")
+    return len(records)
 
 
 def optimize_layout():
     logger.info("Starting layout optimization...")
 
-    sections, products, section_coords, product_info = load_sections_and_products()
+    sections, products, product_info, arrays = load_sections_and_products()
 
-    flow = build_flow_matrix(products, product_info)
-    distances = build_distance_matrix(sections, section_coords)
-    cost = build_cost_matrix(flow, distances, products, sections)
+    distances = build_distance_matrix(arrays["xs"], arrays["ys"])
+    cost = build_cluster_cost_matrix(arrays["cluster_ids"], distances, arrays["cur_idx"])
 
     row_ind, col_ind = solve_assignment(cost)
 
@@ -1,7 +1,9 @@
 """Persist pipeline results to database (idempotent operations)."""
 import logging
 from datetime import datetime
+from sqlalchemy import select, func
 
+from app.cache import clear_cache
 from app.db import session_scope
 from app.models import RunMetadata
 
@@ -30,6 +32,8 @@ def record_pipeline_run(notes: str = None) -> int:
         run_id = run.run_id
         session.commit()
     
+    # The run row changes /stats-visible metadata, so start a new data version
+    clear_cache()
     logger.info(f"✓ Pipeline run recorded with ID: {run_id}")
     return run_id
 
@@ -73,10 +77,12 @@ def persist_all_results(notes: str = None):
     with session_scope() as session:
         from app.models import GraphEdge, SectionCommunity, ProductCluster, Recommendation
         
-        n_edges = session.query(GraphEdge).count()
-        n_communities = session.query(SectionCommunity).count()
-        n_clusters = session.query(ProductCluster).count()
-        n_recommendations = session.query(Recommendation).count()
+        # One round-trip: each count is a scalar subquery of a single SELECT
+        counts = select(*(
+            select(func.count()).select_from(model).scalar_subquery()
+            for model in (GraphEdge, SectionCommunity, ProductCluster, Recommendation)
+        ))
+        n_edges, n_communities, n_clusters, n_recommendations = session.execute(counts).one()
     
     logger.info("✓ Pipeline results summary:")
     logger.info(f"  - Graph edges: {n_edges}")
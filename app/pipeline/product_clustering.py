@@ -1,12 +1,19 @@
 """Cluster products based on co-occurrence in customer sessions."""
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
 from sklearn.metrics import silhouette_score
+from scipy.sparse import coo_matrix, csr_matrix, issparse, load_npz, save_npz
+from joblib import Parallel, delayed
 from collections import defaultdict
+from pathlib import Path
+import hashlib
 import logging
-from typing import Tuple, Dict
+from sqlalchemy import delete, func, select
+from typing import Tuple, Dict, Union, List, Literal
 
+from app.cache import MOVEMENT_VERSION, clear_cache, get_data_version
 from app.db import session_scope
 from app.models import Movement, Product, ProductCluster
 from app.config import Config
@@ -17,104 +24,397 @@ logger = logging.getLogger(__name__)
 # Set random seed
 np.random.seed(Config.RANDOM_SEED)
 
+# Embedding size for clustering the co-occurrence rows
+SVD_COMPONENTS = 32
 
-def build_product_cooccurrence_matrix() -> Tuple[np.ndarray, list]:
+# Products sampled when scoring a clustering by silhouette
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# How find_optimal_k ranks candidate k values
+KSelection = Literal['elbow', 'silhouette']
+
+# Co-occurrence matrices from previous runs, keyed by movement/product state
+COOCCURRENCE_CACHE_DIR = Config.DATA_DIR / 'cache'
+
+
+def cooccurrence_cache_path(
+    movement_version: str, max_path_id: int, n_movements: int, products: list
+) -> Path:
+    """Build the cache file path for a given movement and product state.
+    
+    Args:
+        movement_version: Movement data version token, replaced by every ingest
+        max_path_id: Highest Movement.path_id in the table
+        n_movements: Number of Movement rows
+        products: (product_id, current_section_id) rows in query order
+    
+    Returns:
+        Path of the .npz file holding the matching co-occurrence matrix
+    """
+    digest = hashlib.sha1(
+        repr((movement_version, products, Config.RANDOM_SEED)).encode()
+    ).hexdigest()[:12]
+    return COOCCURRENCE_CACHE_DIR / f'cooc_{max_path_id}_{n_movements}_{digest}.npz'
+
+
+def save_cooccurrence_cache(cooccurrence: csr_matrix, cache_path: Path):
+    """Save a co-occurrence matrix, replacing older cache files.
+    
+    Args:
+        cooccurrence: Sparse co-occurrence matrix
+        cache_path: Path from cooccurrence_cache_path
+    """
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in cache_path.parent.glob('cooc_*.npz'):
+            stale.unlink()
+        save_npz(cache_path, cooccurrence)
+    except OSError as e:
+        logger.warning(f"Could not cache co-occurrence matrix: {e}")
+
+
+def sample_visit_positions(
+    sizes: np.ndarray, n_items: np.ndarray, rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sample up to 3 distinct product positions per section visit.
+    
+    Each draw picks among the remaining slots, then skips past the
+    positions already taken (in increasing order), so no visit repeats a
+    product.
+    
+    Args:
+        sizes: Number of products in the visited section, per visit
+        n_items: Products to take per visit (0-3, at most the section size)
+        rng: Random generator
+    
+    Returns:
+        Tuple of (positions array of shape (n_visits, 3), boolean mask of the
+        same shape marking the first n_items positions of each visit)
+    """
+    u = rng.random((len(sizes), 3))
+    first = (u[:, 0] * sizes).astype(np.int64)
+    second = (u[:, 1] * np.maximum(sizes - 1, 0)).astype(np.int64)
+    second += second >= first
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    third = (u[:, 2] * np.maximum(sizes - 2, 0)).astype(np.int64)
+    third += third >= low
+    third += third >= high
+    positions = np.column_stack([first, second, third])
+    
+    taken = np.arange(3) < n_items[:, None]
+    
+    return positions, taken
+
+
+def group_baskets(
+    basket_ids: np.ndarray, items: np.ndarray, n_products: int
+) -> List[np.ndarray]:
+    """Group sampled products into baskets of distinct products.
+    
+    Args:
+        basket_ids: Basket index of each sampled product
+        items: Sampled product row indices
+        n_products: Number of products (row indices are below this)
+    
+    Returns:
+        List of sorted product index arrays, one per non-empty basket
+    """
+    # One sort dedups products within each basket and groups baskets
+    keys = np.unique(basket_ids * n_products + items)
+    if not len(keys):
+        return []
+    
+    basket_of_key, basket_items = np.divmod(keys, n_products)
+    boundaries = np.flatnonzero(np.diff(basket_of_key)) + 1
+    
+    return np.split(basket_items.astype(np.int32), boundaries)
+
+
+def baskets_to_cooccurrence(baskets: List[np.ndarray], n_products: int) -> csr_matrix:
+    """Count how often each pair of products shares a basket.
+    
+    Args:
+        baskets: Arrays of distinct product row indices
+        n_products: Number of products
+    
+    Returns:
+        Symmetric sparse CSR matrix with a zero diagonal
+    """
+    # Emit (row, col) for every pair in every basket; duplicates are summed
+    # when converting to CSR
+    rows, cols = [], []
+    for basket in baskets:
+        rows.append(np.repeat(basket, len(basket)))
+        cols.append(np.tile(basket, len(basket)))
+    
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int32)
+    
+    # A product does not co-occur with itself
+    off_diagonal = rows != cols
+    rows, cols = rows[off_diagonal], cols[off_diagonal]
+    
+    return coo_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(n_products, n_products)
+    ).tocsr()
+
+
+def build_product_cooccurrence_matrix() -> Tuple[csr_matrix, list]:
     """Build product co-occurrence matrix from customer sessions.
     
     Simulates transactions by taking last 3 sections visited as a 'basket'.
     
     Returns:
-        Tuple of (co-occurrence matrix, product_ids list)
+        Tuple of (sparse CSR co-occurrence matrix, product_ids list)
     """
     logger.info("Building product co-occurrence matrix...")
     
+    # Read before opening the session below: session_scope closes the shared
+    # thread-local session on exit
+    movement_version = get_data_version(MOVEMENT_VERSION)
+    
     with session_scope() as session:
-        # Get all movements
-        movements = session.query(Movement).order_by(
-            Movement.session_id,
-            Movement.step_order
+        # Get all products (plain columns, no ORM objects)
+        products = session.execute(
+            select(Product.product_id, Product.current_section_id)
         ).all()
+        product_ids = [product_id for product_id, _ in products]
+        n_products = len(product_ids)
+        
+        # Reuse the matrix from a previous run if nothing has changed
+        max_path_id, n_movements = session.execute(
+            select(func.max(Movement.path_id), func.count()).select_from(Movement)
+        ).one()
+        cache_path = cooccurrence_cache_path(movement_version, max_path_id, n_movements, products)
+        if cache_path.exists():
+            logger.info(f"✓ Loaded cached co-occurrence matrix from {cache_path}")
+            return load_npz(cache_path).tocsr(), product_ids
         
-        # Get all products
-        products = session.query(Product).all()
+        # Products per section as row indices into the co-occurrence matrix
         product_by_section = defaultdict(list)
-        for product in products:
-            if product.current_section_id:
-                product_by_section[product.current_section_id].append(product.product_id)
+        for idx, (_, section_id) in enumerate(products):
+            if section_id:
+                product_by_section[section_id].append(idx)
+        product_by_section = {
+            section: np.array(indices, dtype=np.int32)
+            for section, indices in product_by_section.items()
+        }
+        
+        # Get all movements as columns
+        movements = pd.read_sql(
+            select(Movement.session_id, Movement.section_id)
+            .order_by(Movement.session_id, Movement.step_order),
+            session.connection()
+        )
         
         logger.info(f"Processing {len(movements)} movements for {len(products)} products...")
         
-        # Build sessions (section sequences)
-        sessions = defaultdict(list)
-        for movement in movements:
-            sessions[movement.session_id].append(movement.section_id)
+        # Build sessions (section sequences) with one hash-based groupby
+        sessions = (
+            movements.groupby('session_id', sort=False)['section_id']
+            .agg(list)
+            .to_dict()
+        )
         
         # Create baskets (simulate purchases from last N sections visited)
-        baskets = []
-        for session_id, section_path in sessions.items():
-            # Take last 3-5 sections as a basket
-            basket_size = min(len(section_path), np.random.randint(3, 6))
-            basket_sections = section_path[-basket_size:]
-            
-            # Get products from these sections
-            basket_products = set()
-            for section in basket_sections:
-                if section in product_by_section:
-                    # Take 1-3 random products from each section
-                    section_products = product_by_section[section]
-                    n_items = min(len(section_products), np.random.randint(1, 4))
-                    sampled = np.random.choice(section_products, size=n_items, replace=False)
-                    basket_products.update(sampled)
-            
-            if basket_products:
-                baskets.append(list(basket_products))
+        rng = np.random.default_rng(Config.RANDOM_SEED)
         
-        logger.info(f"Generated {len(baskets)} simulated baskets")
+        # Draw every basket size (last 3-5 sections) and per-section item
+        # count (1-3 products) up front instead of once per iteration
+        path_lengths = np.fromiter(
+            (len(path) for path in sessions.values()), dtype=np.int64, count=len(sessions)
+        )
+        basket_sizes = np.minimum(path_lengths, rng.integers(3, 6, size=len(sessions)))
+        item_counts = rng.integers(1, 4, size=int(basket_sizes.sum()))
         
-        # Build co-occurrence matrix
-        product_ids = [p.product_id for p in products]
-        n_products = len(product_ids)
-        cooccurrence = np.zeros((n_products, n_products))
+        # Flatten the sections in every basket window, tagged with their basket
+        window_sections = [
+            section
+            for section_path, basket_size in zip(sessions.values(), basket_sizes)
+            for section in section_path[-basket_size:]
+        ]
+        basket_of_visit = np.repeat(np.arange(len(sessions)), basket_sizes)
+        
+        # Concatenate section product lists so each visit is an (offset, size)
+        # slice; sections without products map to the trailing empty slot
+        section_code = {section: code for code, section in enumerate(product_by_section)}
+        section_products = np.concatenate(
+            list(product_by_section.values()) or [np.empty(0, dtype=np.int32)]
+        )
+        section_sizes = np.array(
+            [len(indices) for indices in product_by_section.values()] + [0], dtype=np.int64
+        )
+        section_starts = np.cumsum(section_sizes) - section_sizes
         
-        product_idx = {pid: idx for idx, pid in enumerate(product_ids)}
+        codes = np.array(
+            [section_code.get(section, -1) for section in window_sections], dtype=np.int64
+        )
+        sizes = section_sizes[codes]
+        starts = section_starts[codes]
+        n_items = np.minimum(item_counts, sizes)
         
-        for basket in baskets:
-            # For each pair of products in basket, increment co-occurrence
-            for i, p1 in enumerate(basket):
-                for p2 in basket[i+1:]:
-                    if p1 in product_idx and p2 in product_idx:
-                        idx1, idx2 = product_idx[p1], product_idx[p2]
-                        cooccurrence[idx1, idx2] += 1
-                        cooccurrence[idx2, idx1] += 1
+        positions, taken = sample_visit_positions(sizes, n_items, rng)
+        sampled = section_products[(starts[:, None] + positions)[taken]]
+        sampled_basket = np.broadcast_to(basket_of_visit[:, None], taken.shape)[taken]
+        
+        baskets = group_baskets(sampled_basket, sampled, n_products)
+        
+        logger.info(f"Generated {len(baskets)} simulated baskets")
+        
+        cooccurrence = baskets_to_cooccurrence(baskets, n_products)
         
         logger.info(f"✓ Co-occurrence matrix built: {n_products}x{n_products}")
         
+        save_cooccurrence_cache(cooccurrence, cache_path)
+        
         return cooccurrence, product_ids
 
 
-def find_optimal_k(X: np.ndarray, k_range: range = range(3, 11)) -> int:
-    """Find optimal number of clusters using silhouette score.
+def evaluate_k(X: Union[np.ndarray, csr_matrix], k: int, seed: int) -> Tuple[int, float]:
+    """Fit one candidate k and score it by silhouette.
+    
+    Args:
+        X: Feature matrix (dense or sparse)
+        k: Number of clusters
+        seed: Random seed for clustering and silhouette sampling
+    
+    Returns:
+        Tuple of (k, silhouette score)
+    """
+    # Mini-batches are enough to rank k; the final fit uses full KMeans
+    kmeans = MiniBatchKMeans(
+        n_clusters=k,
+        random_state=seed,
+        n_init=3,
+        batch_size=min(512, X.shape[0]),
+        max_iter=100
+    )
+    labels = kmeans.fit_predict(X)
+    
+    # Sampled silhouette avoids the full n x n pairwise distance matrix
+    score = silhouette_score(
+        X, labels,
+        sample_size=min(SILHOUETTE_SAMPLE_SIZE, X.shape[0]),
+        random_state=seed,
+        metric='euclidean'
+    )
+    return k, score
+
+
+def inertia_sweep(X: Union[np.ndarray, csr_matrix], ks: List[int], seed: int) -> List[float]:
+    """Fit KMeans for each k in increasing order and collect inertias.
+    
+    Each fit is warm-started from the previous centers plus the point
+    farthest from them, so one k-means++ seeding serves the whole sweep.
+    
+    Args:
+        X: Feature matrix (dense or sparse)
+        ks: Increasing k values to fit
+        seed: Random seed for the first seeding
+    
+    Returns:
+        Inertia for each k
+    """
+    inertias = []
+    centers = None
+    for k in ks:
+        if centers is None:
+            kmeans = KMeans(n_clusters=k, init='k-means++', n_init=1, random_state=seed)
+        else:
+            # Pad with the points worst served by the current centers
+            nearest = kmeans.transform(X).min(axis=1)
+            worst = np.argsort(nearest)[::-1][:k - len(centers)]
+            extra = X[worst].toarray() if issparse(X) else X[worst]
+            kmeans = KMeans(
+                n_clusters=k,
+                init=np.vstack([centers, extra]).astype(centers.dtype),
+                n_init=1,
+                random_state=seed
+            )
+        kmeans.fit(X)
+        centers = kmeans.cluster_centers_
+        inertias.append(float(kmeans.inertia_))
+    return inertias
+
+
+def find_elbow(ks: List[int], inertias: List[float]) -> int:
+    """Pick the elbow of a decreasing, convex inertia curve.
+    
+    Uses kneed's KneeLocator when installed, otherwise the point farthest
+    below the chord joining the normalized curve's endpoints.
+    
+    Args:
+        ks: Candidate k values
+        inertias: Inertia for each k
+    
+    Returns:
+        k at the elbow
+    """
+    try:
+        from kneed import KneeLocator
+        knee = KneeLocator(ks, inertias, curve='convex', direction='decreasing').knee
+        if knee is not None:
+            return int(knee)
+    except ImportError:
+        logger.info("kneed not available, using chord-distance elbow")
+    
+    x = np.asarray(ks, dtype=np.float64)
+    y = np.asarray(inertias, dtype=np.float64)
+    x = (x - x[0]) / max(x[-1] - x[0], 1e-12)
+    y = (y - y[-1]) / max(y[0] - y[-1], 1e-12)
+    
+    # The chord runs from (0, 1) to (1, 0); distance below it is 1 - x - y
+    return int(ks[int(np.argmax(1 - x - y))])
+
+
+def find_optimal_k(
+    X: Union[np.ndarray, csr_matrix],
+    k_range: range = range(3, 11),
+    method: KSelection = 'elbow'
+) -> int:
+    """Find optimal number of clusters.
+    
+    The default elbow method reads the inertia curve of one warm-started
+    KMeans sweep. The silhouette method fits and scores each k in parallel,
+    one process per k.
     
     Args:
-        X: Feature matrix
+        X: Feature matrix (dense or sparse)
         k_range: Range of k values to try
+        method: 'elbow' or 'silhouette'
     
     Returns:
         Optimal k value
     """
     logger.info(f"Finding optimal k in range {k_range.start}-{k_range.stop-1}...")
     
+    # float32 halves memory traffic in the distance computations; the sparse
+    # co-occurrence matrix is already float32
+    if not issparse(X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+    
+    ks = [k for k in k_range if k < X.shape[0]]
+    
+    # An elbow needs at least three points on the curve
+    if method == 'elbow' and len(ks) >= 3:
+        inertias = inertia_sweep(X, ks, Config.RANDOM_SEED)
+        for k, inertia in zip(ks, inertias):
+            logger.info(f"  k={k}: inertia = {inertia:.4f}")
+        
+        best_k = find_elbow(ks, inertias)
+        logger.info(f"✓ Optimal k = {best_k} (elbow)")
+        return best_k
+    
     best_score = -1
     best_k = k_range.start
     
-    for k in k_range:
-        if k >= len(X):
-            continue
-        
-        kmeans = KMeans(n_clusters=k, random_state=Config.RANDOM_SEED, n_init=10)
-        labels = kmeans.fit_predict(X)
-        score = silhouette_score(X, labels)
-        
+    results = Parallel(n_jobs=-1, backend='loky')(
+        delayed(evaluate_k)(X, k, Config.RANDOM_SEED)
+        for k in ks
+    )
+    
+    for k, score in results:
         logger.info(f"  k={k}: silhouette score = {score:.4f}")
         
         if score > best_score:
@@ -126,14 +426,14 @@ def find_optimal_k(X: np.ndarray, k_range: range = range(3, 11)) -> int:
 
 
 def cluster_products_kmeans(
-    cooccurrence: np.ndarray,
+    cooccurrence: Union[np.ndarray, csr_matrix],
     product_ids: list,
     k: int = None
 ) -> Dict[int, int]:
     """Cluster products using KMeans.
     
     Args:
-        cooccurrence: Co-occurrence matrix
+        cooccurrence: Co-occurrence matrix (dense or sparse CSR)
         product_ids: List of product IDs
         k: Number of clusters (if None, auto-select)
     
@@ -142,13 +442,29 @@ def cluster_products_kmeans(
     """
     logger.info("Clustering products with KMeans...")
     
+    # Counts are small integers; float32 is plenty and halves KMeans memory traffic
+    if issparse(cooccurrence):
+        X = cooccurrence.astype(np.float32, copy=False)
+    else:
+        X = np.ascontiguousarray(cooccurrence, dtype=np.float32)
+    
+    # Cluster in a low-dimensional embedding instead of raw n-dim rows
+    n_components = min(SVD_COMPONENTS, X.shape[1] - 1)
+    if n_components >= 1:
+        svd = TruncatedSVD(n_components=n_components, random_state=Config.RANDOM_SEED)
+        X = svd.fit_transform(X)
+        logger.info(
+            f"Reduced features to {n_components} SVD components "
+            f"({svd.explained_variance_ratio_.sum():.1%} variance explained)"
+        )
+    
     # Find optimal k if not provided
     if k is None:
-        k = find_optimal_k(cooccurrence, range(3, 11))
+        k = find_optimal_k(X, range(3, 11))
     
     # Cluster
     kmeans = KMeans(n_clusters=k, random_state=Config.RANDOM_SEED, n_init=10)
-    labels = kmeans.fit_predict(cooccurrence)
+    labels = kmeans.fit_predict(X)
     
     # Create mapping
     clustering = {product_ids[i]: int(labels[i]) for i in range(len(product_ids))}
@@ -170,24 +486,24 @@ def save_clusters_to_db(clustering: Dict[int, int]) -> int:
     logger.info("Saving product clusters to database...")
     
     with session_scope() as session:
-        # Delete existing clusters
-        deleted = session.query(ProductCluster).delete()
-        logger.info(f"Deleted {deleted} existing product clusters")
-        
-        # Insert new clusters
-        clusters = [
-            ProductCluster(
-                product_id=product_id,
-                cluster_id=cluster_id
-            )
-            for product_id, cluster_id in clustering.items()
-        ]
+        # Core DELETE: no ORM row loading, and it rolls back with the insert
+        session.execute(delete(ProductCluster))
+        logger.info("Cleared existing product clusters")
         
-        session.bulk_save_objects(clusters)
+        # Insert new clusters in the same transaction (single executemany)
+        if clustering:
+            session.execute(
+                ProductCluster.__table__.insert(),
+                [
+                    {'product_id': product_id, 'cluster_id': cluster_id}
+                    for product_id, cluster_id in clustering.items()
+                ]
+            )
         session.commit()
     
-    logger.info(f"✓ Saved {len(clusters)} product cluster assignments")
-    return len(clusters)
+    clear_cache()
+    logger.info(f"✓ Saved {len(clustering)} product cluster assignments")
+    return len(clustering)
 
 
 def get_cluster_statistics(clustering: Dict[int, int]) -> Dict:
@@ -2,6 +2,7 @@
 import argparse
 import logging
 import time
+from concurrent.futures import ProcessPoolExecutor, wait, ALL_COMPLETED
 from datetime import datetime
 
 from app.pipeline.ingest import ingest_all
@@ -18,6 +19,23 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def reset_db_pool():
+    """Drop pooled connections inherited from the parent process.
+    
+    Runs once in each worker process so it opens its own MySQL connections
+    instead of sharing the parent's sockets.
+    """
+    from app.db import engine
+    engine.dispose(close=False)
+
+
+def timed_step(step) -> float:
+    """Run a pipeline step and return its wall-clock time in seconds."""
+    step_start = time.time()
+    step()
+    return time.time() - step_start
+
+
 def run_pipeline(rebuild: bool = False, skip_ingest: bool = False):
     """Run the complete pipeline.
     
@@ -51,19 +69,17 @@ def run_pipeline(rebuild: bool = False, skip_ingest: bool = False):
         step_time = time.time() - step_start
         steps_completed.append(('Build Graph', step_time))
         
-        # Step 3: Detect communities
+        # Steps 3 + 4: Detect communities and cluster products. Both only read
+        # the graph and movements written above, so they run side by side.
         logger.info("\n[3/6] DETECTING SECTION COMMUNITIES...")
-        step_start = time.time()
-        detect_section_communities()
-        step_time = time.time() - step_start
-        steps_completed.append(('Detect Communities', step_time))
+        logger.info("[4/6] CLUSTERING PRODUCTS... (in parallel)")
+        with ProcessPoolExecutor(max_workers=2, initializer=reset_db_pool) as executor:
+            communities = executor.submit(timed_step, detect_section_communities)
+            clusters = executor.submit(timed_step, cluster_products)
+            wait([communities, clusters], return_when=ALL_COMPLETED)
         
-        # Step 4: Cluster products
-        logger.info("\n[4/6] CLUSTERING PRODUCTS...")
-        step_start = time.time()
-        cluster_products()
-        step_time = time.time() - step_start
-        steps_completed.append(('Cluster Products', step_time))
+        steps_completed.append(('Detect Communities', communities.result()))
+        steps_completed.append(('Cluster Products', clusters.result()))
         
         # Step 5: Optimize layout
         logger.info("\n[5/6] OPTIMIZING LAYOUT...")
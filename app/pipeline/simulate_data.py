@@ -1,7 +1,7 @@
 """Generate realistic synthetic data for customer paths and products."""
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 import logging
 
@@ -10,9 +10,6 @@ from app.config import Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set random seed for reproducibility
-np.random.seed(Config.RANDOM_SEED)
-
 
 def generate_customer_paths(
     n_sessions: int = 10000,
@@ -53,73 +50,103 @@ def generate_customer_paths(
         'specialty': ['N', 'P', 'S', 'T', 'U', 'V', 'W', 'X']  # Health, baby, pharmacy, etc.
     }
     
-    all_paths = []
+    rng = np.random.default_rng(Config.RANDOM_SEED)
     base_time = datetime(2024, 1, 1, 9, 0, 0)
+    max_steps = 15
     
-    for session_idx in range(n_sessions):
-        session_id = f"sess_{session_idx:06d}"
-        
-        # Path length: 3-15 steps (most customers visit 5-8 sections)
-        path_length = int(np.random.gamma(3, 2)) + 3
-        path_length = min(path_length, 15)
+    # Every label a path can contain: the sections plus the hard-coded
+    # entrance, checkout and community sections
+    labels = list(dict.fromkeys(
+        sections + ['A', 'M'] + [s for members in communities.values() for s in members]
+    ))
+    label_idx = {label: i for i, label in enumerate(labels)}
+    entrance, checkout = label_idx['A'], label_idx['M']
+    
+    # Community members as a padded (n_communities, max_size) index table
+    community_sizes = np.array([len(members) for members in communities.values()])
+    community_table = np.zeros((len(communities), community_sizes.max()), dtype=np.int64)
+    for c, members in enumerate(communities.values()):
+        community_table[c, :len(members)] = [label_idx[s] for s in members]
+    
+    # Path length: 3-15 steps (most customers visit 5-8 sections)
+    path_lengths = np.minimum(rng.gamma(3, 2, n_sessions).astype(np.int64) + 3, max_steps)
+    
+    # Start time (spread across operating hours)
+    start_offsets = (
+        rng.integers(0, 30, n_sessions) * 86400
+        + rng.integers(0, 12, n_sessions) * 3600
+        + rng.integers(0, 60, n_sessions) * 60
+    )
+    
+    # One extra column for the optional checkout step
+    paths = np.zeros((n_sessions, max_steps + 1), dtype=np.int64)
+    
+    # Most paths start at entrance (A), sometimes elsewhere among the first 10
+    starts_elsewhere = rng.random(n_sessions) >= 0.8
+    paths[:, 0] = np.where(
+        starts_elsewhere,
+        rng.integers(0, min(10, len(sections)), n_sessions),
+        entrance
+    )
+    
+    # Choose a primary community for each session
+    primary = rng.integers(0, len(communities), n_sessions)
+    sizes = community_sizes[primary]
+    
+    # Generate all paths one step at a time, vectorized across sessions
+    stay = rng.random((n_sessions, max_steps)) < 0.7
+    explore = rng.choice(len(sections), size=(n_sessions, max_steps), p=section_weights)
+    uniform = rng.random((n_sessions, max_steps))
+    for step in range(1, max_steps):
+        prev = paths[:, step - 1]
         
-        # Start time (spread across operating hours)
-        session_start = base_time + timedelta(
-            days=np.random.randint(0, 30),
-            hours=np.random.randint(0, 12),
-            minutes=np.random.randint(0, 60)
+        # Stay in community, avoiding an immediate repeat: draw among the
+        # other members and skip over the previous section's slot
+        members = community_table[primary]
+        prev_slot = np.where(
+            (members == prev[:, None]).any(axis=1),
+            (members == prev[:, None]).argmax(axis=1),
+            sizes
         )
+        n_candidates = sizes - (prev_slot < sizes)
+        slot = (uniform[:, step] * n_candidates).astype(np.int64)
+        slot += slot >= prev_slot
+        in_community = members[np.arange(n_sessions), slot]
         
-        # Most paths start at entrance (A)
-        if np.random.random() < 0.8:
-            path = ['A']
-        else:
-            path = [np.random.choice(sections[:10])]  # Sometimes start elsewhere
-        
-        # Choose a primary community for this session
-        primary_community = np.random.choice(list(communities.keys()))
-        community_sections = communities[primary_community]
-        
-        # Generate path
-        current_time = session_start
-        for step in range(1, path_length):
-            # 70% chance to stay in primary community, 30% to explore
-            if np.random.random() < 0.7 and len(community_sections) > 0:
-                # Stay in community (avoid immediate repeats)
-                candidates = [s for s in community_sections if s != path[-1]]
-                if candidates:
-                    next_section = np.random.choice(candidates)
-                else:
-                    next_section = np.random.choice(sections)
-            else:
-                # Explore other sections
-                next_section = np.random.choice(sections, p=section_weights)
-            
-            path.append(next_section)
-            
-            # Time between steps: 30 seconds to 5 minutes
-            current_time += timedelta(seconds=np.random.randint(30, 300))
-        
-        # Most paths end at checkout (M)
-        if np.random.random() < 0.7 and path[-1] != 'M':
-            path.append('M')
-            current_time += timedelta(seconds=np.random.randint(30, 180))
-        
-        # Create records for this session
-        for step_order, section_id in enumerate(path):
-            all_paths.append({
-                'session_id': session_id,
-                'step_order': step_order,
-                'section_id': section_id,
-                'timestamp': current_time + timedelta(seconds=step_order * 60)
-            })
+        # 70% chance to stay in primary community, 30% to explore
+        paths[:, step] = np.where(stay[:, step], in_community, explore[:, step])
+    
+    # Time between steps: 30 seconds to 5 minutes
+    step_gaps = rng.integers(30, 300, (n_sessions, max_steps - 1))
+    step_gaps[np.arange(1, max_steps) >= path_lengths[:, None]] = 0
+    elapsed = step_gaps.sum(axis=1)
+    
+    # Most paths end at checkout (M)
+    last = paths[np.arange(n_sessions), path_lengths - 1]
+    ends_at_checkout = (rng.random(n_sessions) < 0.7) & (last != checkout)
+    paths[np.arange(n_sessions), path_lengths] = checkout
+    elapsed += np.where(ends_at_checkout, rng.integers(30, 180, n_sessions), 0)
+    path_lengths = path_lengths + ends_at_checkout
+    
+    # Flatten the valid steps of every session into records
+    in_path = np.arange(max_steps + 1) < path_lengths[:, None]
+    step_order = np.broadcast_to(np.arange(max_steps + 1), paths.shape)[in_path]
+    session_end = np.datetime64(base_time, 's') + (start_offsets + elapsed).astype('timedelta64[s]')
     
     # Create DataFrame
-    df = pd.DataFrame(all_paths)
+    df = pd.DataFrame({
+        'session_id': np.repeat([f"sess_{i:06d}" for i in range(n_sessions)], path_lengths),
+        'step_order': step_order,
+        'section_id': np.array(labels)[paths[in_path]],
+        'timestamp': (
+            np.repeat(session_end, path_lengths)
+            + step_order.astype('timedelta64[m]')
+        ).astype('datetime64[ns]')
+    })
     
-    # Save to CSV
+    # Save to CSV (written in row chunks)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(output_path, index=False)
+    df.to_csv(output_path, index=False, chunksize=100_000)
     
     logger.info(f"✓ Generated {len(df)} movement records from {n_sessions} sessions")
     logger.info(f"✓ Saved to {output_path}")
@@ -127,6 +154,21 @@ def generate_customer_paths(
     return df
 
 
+def choose_per_row(rng: np.random.Generator, options: list) -> np.ndarray:
+    """Pick one element uniformly from each row's own list of options.
+    
+    Args:
+        rng: Random generator
+        options: One non-empty list of candidates per row
+    
+    Returns:
+        Array with the chosen element for every row
+    """
+    counts = np.array([len(row) for row in options])
+    picks = (rng.random(len(options)) * counts).astype(np.int64)
+    return np.array([row[i] for row, i in zip(options, picks)])
+
+
 def generate_products(
     n_products: int = 100,
     sections: list = None,
@@ -201,55 +243,39 @@ def generate_products(
     adjectives = ['Premium', 'Value', 'Family Size', 'Single Serve', 'Large', 
                   'Small', 'Economy', 'Deluxe', 'Classic', 'Special']
     
-    products = []
-    product_id = 1
+    rng = np.random.default_rng(Config.RANDOM_SEED)
+    category_names = list(categories.keys())
     
-    # Distribute products across categories
+    # Distribute products across categories, then fill the remainder with
+    # random categories
     products_per_category = n_products // len(categories)
+    n_distributed = products_per_category * len(categories)
+    category = np.concatenate([
+        np.repeat(category_names, products_per_category),
+        rng.choice(category_names, size=n_products - n_distributed)
+    ])
     
-    for category, typical_sections in categories.items():
-        templates = product_templates.get(category, ['{} Item'])
-        
-        for _ in range(products_per_category):
-            # Generate product name
-            template = np.random.choice(templates)
-            adjective = np.random.choice(adjectives)
-            name = template.format(adjective)
-            
-            # Assign to typical section (with some randomness)
-            if np.random.random() < 0.8 and typical_sections:
-                section = np.random.choice(typical_sections)
-            else:
-                # Sometimes products are misplaced
-                section = np.random.choice(sections[1:13])  # Avoid entrance/checkout
-            
-            products.append({
-                'product_id': product_id,
-                'name': name,
-                'category': category,
-                'current_section_id': section
-            })
-            product_id += 1
-    
-    # Fill remaining products if needed
-    while len(products) < n_products:
-        category = np.random.choice(list(categories.keys()))
-        templates = product_templates.get(category, ['{} Item'])
-        template = np.random.choice(templates)
-        adjective = np.random.choice(adjectives)
-        name = template.format(adjective)
-        section = np.random.choice(sections[1:13])
-        
-        products.append({
-            'product_id': product_id,
-            'name': name,
-            'category': category,
-            'current_section_id': section
-        })
-        product_id += 1
+    # Generate product names: a random template per category, random adjective
+    template = choose_per_row(
+        rng, [product_templates.get(c, ['{} Item']) for c in category]
+    )
+    adjective = rng.choice(adjectives, size=n_products)
+    name = np.char.replace(template, '{}', adjective)
+    
+    # Assign to typical section (with some randomness); the remainder and
+    # misplaced products go anywhere but entrance/checkout
+    typical = choose_per_row(rng, [categories[c] for c in category])
+    misplaced = rng.choice(sections[1:13], size=n_products)
+    keep_typical = (rng.random(n_products) < 0.8) & (np.arange(n_products) < n_distributed)
+    section = np.where(keep_typical, typical, misplaced)
     
     # Create DataFrame
-    df = pd.DataFrame(products)
+    df = pd.DataFrame({
+        'product_id': np.arange(1, n_products + 1),
+        'name': name,
+        'category': category,
+        'current_section_id': section
+    })
     
     # Save to CSV
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,24 @@
+"""Gunicorn configuration for serving the dashboard and API in production.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app.dashboard.server:app
+"""
+import multiprocessing
+import os
+
+# Server socket
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Worker processes (threaded workers share one connection pool per process)
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Import the app once in the master and fork workers from it
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool instead of the parent's sockets."""
+    from app.db import engine
+    engine.dispose(close=False)
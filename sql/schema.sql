@@ -8,6 +8,7 @@ DROP TABLE IF EXISTS movement;
 DROP TABLE IF EXISTS product;
 DROP TABLE IF EXISTS store_section;
 DROP TABLE IF EXISTS run_metadata;
+DROP TABLE IF EXISTS data_version;
 
 -- Store sections with grid coordinates
 CREATE TABLE store_section (
@@ -37,7 +38,7 @@ CREATE TABLE movement (
     section_id VARCHAR(10) NOT NULL,
     ts DATETIME NOT NULL,
     FOREIGN KEY (section_id) REFERENCES store_section(section_id) ON DELETE CASCADE,
-    INDEX idx_session (session_id, step_order),
+    INDEX idx_session (session_id, step_order, section_id),
     INDEX idx_section_time (section_id, ts)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -84,4 +85,11 @@ CREATE TABLE run_metadata (
     run_id INT PRIMARY KEY AUTO_INCREMENT,
     created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     notes TEXT
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Tokens replaced whenever pipeline data is rewritten (API ETags and caches)
+CREATE TABLE data_version (
+    name VARCHAR(50) PRIMARY KEY,
+    token VARCHAR(32) NOT NULL,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
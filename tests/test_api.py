@@ -1,5 +1,6 @@
 """Tests for API endpoints."""
 import pytest
+from app.cache import clear_cache, get_data_version
 from app.dashboard.server import create_app
 
 
@@ -111,6 +112,20 @@ def test_get_products(client):
     assert 'data' in data
 
 
+def test_get_products_with_pagination(client):
+    """Test GET /api/products with page and per_page parameters."""
+    response = client.get('/api/products?page=1&per_page=5')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    
+    if data['success']:
+        assert data['count'] <= 5
+        assert data['page'] == 1
+        assert data['per_page'] == 5
+        assert 'total' in data
+
+
 def test_get_communities(client):
     """Test GET /api/communities endpoint."""
     response = client.get('/api/communities')
@@ -143,6 +158,26 @@ def test_get_stats(client):
         assert isinstance(stats['sections'], int)
 
 
+def test_stats_not_modified(client):
+    """Test GET /api/stats returns 304 when the client's ETag is current."""
+    response = client.get('/api/stats')
+    etag = response.headers.get('ETag')
+    
+    if response.status_code == 200 and etag:
+        response = client.get('/api/stats', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+
+def test_clear_cache_changes_data_version(client):
+    """Test that clearing the cache starts a new data version (and ETag)."""
+    with client.application.app_context():
+        version = get_data_version()
+        assert get_data_version() == version
+        
+        clear_cache()
+        assert get_data_version() != version
+
+
 def test_index_page(client):
     """Test dashboard index page."""
     response = client.get('/')
@@ -1,42 +1,126 @@
 """Tests for graph building functionality."""
 import pytest
+from collections import OrderedDict
 import networkx as nx
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from app.config import Config
 from app.pipeline.build_graph import (
+    build_csr_graph,
     build_networkx_graph,
+    build_networkx_graph_from_path,
+    get_csr_graph_statistics,
     get_graph_statistics
 )
+from app.pipeline import build_graph, detect_communities
+from app.pipeline.detect_communities import detect_communities_greedy, graph_fingerprint
 
 
-def test_build_graph_from_transitions():
+def make_transitions(src: list, dst: list, count: list) -> pd.DataFrame:
+    """Build a transitions DataFrame column by column with explicit dtypes."""
+    return pd.DataFrame({
+        'src_section_id': np.array(src, dtype=object),
+        'dst_section_id': np.array(dst, dtype=object),
+        'count': np.array(count, dtype=np.int32),
+    })
+
+
+@pytest.mark.parametrize('transitions_df,n_nodes,n_edges,weights', [
+    (
+        make_transitions(['A', 'B', 'A'], ['B', 'C', 'C'], [10, 5, 3]),
+        3, 3, {('A', 'B'): 10, ('B', 'C'): 5},
+    ),
+    (
+        make_transitions([], [], []),
+        0, 0, {},
+    ),
+    # Self-loop should be included if in data
+    (
+        make_transitions(['A', 'A'], ['A', 'B'], [100, 10]),
+        2, 2, {('A', 'A'): 100, ('A', 'B'): 10},
+    ),
+    # Repeated transitions are summed into one edge
+    (
+        make_transitions(['A', 'B', 'A'], ['B', 'C', 'B'], [10, 5, 4]),
+        3, 2, {('A', 'B'): 14, ('B', 'C'): 5},
+    ),
+], ids=['transitions', 'empty', 'self_loop', 'duplicates'])
+def test_build_graph_from_transitions(transitions_df, n_nodes, n_edges, weights):
     """Test building NetworkX graph from transition data."""
-    # Create sample transition data
-    transitions_df = pd.DataFrame([
-        {'src_section_id': 'A', 'dst_section_id': 'B', 'count': 10},
-        {'src_section_id': 'B', 'dst_section_id': 'C', 'count': 5},
-        {'src_section_id': 'A', 'dst_section_id': 'C', 'count': 3},
-    ])
-    
-    # Build graph
     G = build_networkx_graph(transitions_df)
     
     # Assertions
+    assert G.number_of_nodes() == n_nodes
+    assert G.number_of_edges() == n_edges
+    
+    # One snapshot of all edge weights instead of per-edge adjacency lookups
+    edge_weights = nx.get_edge_attributes(G, 'weight')
+    assert {edge: edge_weights.get(edge) for edge in weights} == weights
+
+
+def test_build_graph_from_path(tmp_path):
+    """Test building the graph from a transitions CSV with repeated rows."""
+    path = tmp_path / 'transitions.csv'
+    make_transitions(['A', 'B', 'A'], ['B', 'C', 'B'], [10, 5, 4]).to_csv(path, index=False)
+    
+    G = build_networkx_graph_from_path(path)
+    
     assert G.number_of_nodes() == 3
-    assert G.number_of_edges() == 3
+    assert G.number_of_edges() == 2
+    assert nx.get_edge_attributes(G, 'weight') == {('A', 'B'): 14, ('B', 'C'): 5}
+
+
+@pytest.mark.parametrize('filename', ['transitions.CSV', 'transitions.csv.gz'])
+def test_build_graph_from_path_csv_suffixes(tmp_path, monkeypatch, filename):
+    """Test CSV detection for other suffixes, summing across chunks."""
+    monkeypatch.setattr(build_graph, 'TRANSITION_FILE_CHUNK_ROWS', 2)
+    path = tmp_path / filename
+    make_transitions(
+        ['A', 'B', 'A', 'A', 'B'], ['B', 'C', 'B', 'C', 'C'], [10, 5, 4, 1, 2]
+    ).to_csv(path, index=False)
+    
+    G = build_networkx_graph_from_path(path)
+    
+    assert nx.get_edge_attributes(G, 'weight') == {
+        ('A', 'B'): 14, ('A', 'C'): 1, ('B', 'C'): 7
+    }
+
+
+def test_self_loops_dropped():
+    """Test that keep_self_loops=False removes (X, X) transitions."""
+    transitions_df = make_transitions(['A', 'A'], ['A', 'B'], [100, 10])
+    
+    G = build_networkx_graph(transitions_df, keep_self_loops=False)
+    adjacency, section_ids = build_csr_graph(transitions_df, keep_self_loops=False)
+    
+    assert G.number_of_edges() == 1
+    assert not G.has_edge('A', 'A')
     assert G.has_edge('A', 'B')
+    assert adjacency.nnz == 1
+    assert adjacency.diagonal().sum() == 0
+
+
+def test_build_graph_cugraph_backend(monkeypatch):
+    """Test building the graph through the nx-cugraph backend."""
+    pytest.importorskip('nx_cugraph')
+    monkeypatch.setattr(Config, 'USE_CUGRAPH', True)
+    
+    transitions_df = make_transitions(['A', 'B'], ['B', 'C'], [10, 5])
+    
+    G = build_networkx_graph(transitions_df)
+    
+    assert G.number_of_nodes() == 3
+    assert G.number_of_edges() == 2
     assert G['A']['B']['weight'] == 10
-    assert G['B']['C']['weight'] == 5
 
 
 def test_graph_statistics():
     """Test graph statistics computation."""
     # Create simple graph
     G = nx.DiGraph()
-    G.add_edge('A', 'B', weight=10)
-    G.add_edge('B', 'C', weight=5)
-    G.add_edge('C', 'A', weight=3)
+    G.add_weighted_edges_from([('A', 'B', 10), ('B', 'C', 5), ('C', 'A', 3)])
     
     # Get statistics
     stats = get_graph_statistics(G)
@@ -47,55 +131,85 @@ def test_graph_statistics():
     assert stats['avg_degree'] == 2.0  # Each node has degree 2
 
 
-def test_empty_graph():
-    """Test handling of empty graph."""
-    transitions_df = pd.DataFrame(columns=['src_section_id', 'dst_section_id', 'count'])
+def test_csr_graph_matches_networkx():
+    """Test that the CSR graph gives the same weights and statistics."""
+    transitions_df = make_transitions(['A', 'B', 'A'], ['B', 'C', 'C'], [10, 5, 3])
     
-    G = build_networkx_graph(transitions_df)
+    adjacency, section_ids = build_csr_graph(transitions_df)
+    index = {section: i for i, section in enumerate(section_ids)}
     
-    assert G.number_of_nodes() == 0
-    assert G.number_of_edges() == 0
+    # Assertions
+    assert adjacency.shape == (3, 3)
+    assert adjacency.dtype == np.int32
+    assert adjacency.nnz == 3
+    assert adjacency[index['A'], index['B']] == 10
+    assert adjacency[index['B'], index['C']] == 5
+    assert get_csr_graph_statistics(adjacency, section_ids) == get_graph_statistics(
+        build_networkx_graph(transitions_df)
+    )
 
 
-def test_self_loops_excluded():
-    """Test that self-loops are handled correctly."""
-    transitions_df = pd.DataFrame([
-        {'src_section_id': 'A', 'dst_section_id': 'A', 'count': 100},  # Self-loop
-        {'src_section_id': 'A', 'dst_section_id': 'B', 'count': 10},
-    ])
-    
-    G = build_networkx_graph(transitions_df)
-    
-    # Self-loop should be included if in data
-    assert G.number_of_edges() == 2
-    assert G.has_edge('A', 'A')
-    assert G.has_edge('A', 'B')
+@pytest.fixture(scope='session')
+def community_graph():
+    """Graph with clear community structure, built once per test session."""
+    # Triangles A-B-C and D-E-F, weakly connected by C-D
+    edges = make_transitions(
+        ['A', 'B', 'C', 'D', 'E', 'F', 'C'],
+        ['B', 'C', 'A', 'E', 'F', 'D', 'D'],
+        [10, 10, 10, 10, 10, 10, 1],
+    ).rename(columns={'count': 'weight'})
+    return nx.from_pandas_edgelist(
+        edges, 'src_section_id', 'dst_section_id', edge_attr='weight', create_using=nx.Graph
+    )
+
 
+@pytest.fixture(scope='session')
+def community_partition(community_graph):
+    """Greedy modularity partition of community_graph, detected once."""
+    return detect_communities_greedy(community_graph)
 
-def test_community_count():
+
+def test_community_count(community_partition):
     """Test that community detection finds reasonable number of communities."""
-    # Create graph with clear community structure
-    G = nx.Graph()
+    communities = set(community_partition.values())
+    
+    # Should detect 2 communities
+    assert len(communities) >= 1  # At least 1 community
+    assert len(communities) <= 3  # At most 3 communities (reasonable range)
+
+
+def test_community_cache(community_graph, community_partition, monkeypatch):
+    """Test that an identical graph is answered from the cache."""
+    assert graph_fingerprint(community_graph) in detect_communities.GREEDY_CACHE
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("community detection re-ran for a cached graph")
     
-    # Community 1
-    G.add_edge('A', 'B', weight=10)
-    G.add_edge('B', 'C', weight=10)
-    G.add_edge('C', 'A', weight=10)
+    monkeypatch.setattr(detect_communities, 'igraph_partition', fail)
+    monkeypatch.setattr(nx.community, 'greedy_modularity_communities', fail)
     
-    # Community 2
-    G.add_edge('D', 'E', weight=10)
-    G.add_edge('E', 'F', weight=10)
-    G.add_edge('F', 'D', weight=10)
+    assert detect_communities_greedy(community_graph.copy()) == community_partition
+
+
+def test_graph_fingerprint_node_types():
+    """Test that graphs differing only in node label types do not share a fingerprint."""
+    G_int = nx.Graph([(1, 2), (2, 3)])
+    G_str = nx.Graph([('1', '2'), ('2', '3')])
     
-    # Weak connection between communities
-    G.add_edge('C', 'D', weight=1)
+    assert graph_fingerprint(G_int) != graph_fingerprint(G_str)
+    assert graph_fingerprint(G_int) == graph_fingerprint(nx.Graph([(3, 2), (2, 1)]))
+
+
+def test_community_cache_bounded(monkeypatch):
+    """Test that the partition cache evicts its least recently used graphs."""
+    monkeypatch.setattr(detect_communities, 'GREEDY_CACHE', OrderedDict())
+    monkeypatch.setattr(detect_communities, 'GREEDY_CACHE_SIZE', 2)
     
-    # Detect communities using NetworkX
-    communities = list(nx.community.greedy_modularity_communities(G, weight='weight'))
+    graphs = [nx.path_graph(n) for n in (3, 4, 5)]
+    for G in graphs:
+        detect_communities_greedy(G)
     
-    # Should detect 2 communities
-    assert len(communities) >= 1  # At least 1 community
-    assert len(communities) <= 3  # At most 3 communities (reasonable range)
+    assert list(detect_communities.GREEDY_CACHE) == [graph_fingerprint(G) for G in graphs[1:]]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,34 @@
+"""Tests for CSV ingestion."""
+import pytest
+
+from app.pipeline.ingest import load_data_infile
+
+
+class RecordingSession:
+    """Session stand-in that keeps the SQL it is asked to run."""
+    
+    def __init__(self):
+        self.statements = []
+    
+    def execute(self, stmt, params=None):
+        self.statements.append(str(stmt))
+        return type('Result', (), {'rowcount': 1})()
+
+
+@pytest.mark.parametrize('newline,terminator', [
+    (b'\n', "LINES TERMINATED BY '\\n'"),
+    (b'\r\n', "LINES TERMINATED BY '\\r\\n'"),
+], ids=['lf', 'crlf'])
+def test_load_data_infile_line_endings(tmp_path, newline, terminator):
+    """Test that LOAD DATA uses the CSV's own line terminator."""
+    path = tmp_path / 'paths.csv'
+    path.write_bytes(newline.join([b'session_id,ts', b's1,2024-01-01 10:00:00', b'']))
+    session = RecordingSession()
+    
+    load_data_infile(session, 'movement', path, ['session_id', 'ts'])
+    
+    assert terminator in session.statements[0]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
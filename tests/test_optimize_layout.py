@@ -0,0 +1,78 @@
+"""Tests for layout optimization cost matrices."""
+import pytest
+import numpy as np
+
+from app.pipeline.optimize_layout import (
+    CROSS_CLUSTER_FLOW,
+    SAME_CLUSTER_FLOW,
+    build_cluster_cost_matrix,
+    build_distance_matrix
+)
+
+
+def reference_cost_matrix(cids, distances, cur_idx):
+    """Cost matrix computed pair by pair from the cluster flow definition."""
+    n_products, n_sections = len(cids), len(distances)
+    cost = np.zeros((n_products, n_sections))
+
+    for i in range(n_products):
+        for k in range(n_products):
+            if k == i or cids[i] == -1 or cids[k] == -1 or cur_idx[k] < 0:
+                continue
+            flow = SAME_CLUSTER_FLOW if cids[i] == cids[k] else CROSS_CLUSTER_FLOW
+            for j in range(n_sections):
+                cost[i, j] += flow * distances[j, cur_idx[k]]
+
+    return cost
+
+
+def test_distance_matrix():
+    """Test pairwise Manhattan distances between sections."""
+    xs = np.array([0, 3, 1], dtype=np.int32)
+    ys = np.array([0, 4, 1], dtype=np.int32)
+
+    distances = build_distance_matrix(xs, ys)
+
+    assert distances.shape == (3, 3)
+    assert distances[0, 1] == 7
+    assert distances[1, 2] == 5
+    assert np.array_equal(distances, distances.T)
+    assert not distances.diagonal().any()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_cluster_cost_matrix_matches_reference(seed):
+    """Test the factored cost matrix against the pairwise definition."""
+    rng = np.random.default_rng(seed)
+    n_products, n_sections = 12, 7
+
+    xs = rng.integers(0, 6, n_sections).astype(np.int32)
+    ys = rng.integers(0, 6, n_sections).astype(np.int32)
+    distances = build_distance_matrix(xs, ys)
+
+    # Mix of clusters, unclustered products and unknown current sections
+    cids = rng.integers(-1, 3, n_products).astype(np.int32)
+    cur_idx = rng.integers(-1, n_sections, n_products).astype(np.int32)
+
+    cost = build_cluster_cost_matrix(cids, distances, cur_idx)
+
+    assert cost.shape == (n_products, n_sections)
+    np.testing.assert_allclose(cost, reference_cost_matrix(cids, distances, cur_idx))
+
+
+def test_cluster_cost_matrix_unclustered():
+    """Test that products without clusters produce an all-zero cost matrix."""
+    distances = build_distance_matrix(
+        np.array([0, 1], dtype=np.int32), np.array([0, 0], dtype=np.int32)
+    )
+    cids = np.array([-1, -1, -1], dtype=np.int32)
+    cur_idx = np.array([0, 1, 0], dtype=np.int32)
+
+    cost = build_cluster_cost_matrix(cids, distances, cur_idx)
+
+    assert cost.shape == (3, 2)
+    assert not cost.any()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,73 @@
+"""Tests for basket sampling and product co-occurrence."""
+import pytest
+import numpy as np
+
+from app.pipeline.product_clustering import (
+    baskets_to_cooccurrence,
+    group_baskets,
+    sample_visit_positions
+)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sample_visit_positions(seed):
+    """Test that sampled positions are distinct, in range and n_items-sized."""
+    rng = np.random.default_rng(seed)
+    # Empty, single-product, two-product and larger sections, repeated
+    sizes = np.tile(np.array([0, 1, 2, 3, 4, 7], dtype=np.int64), 50)
+    n_items = np.minimum(rng.integers(1, 4, size=len(sizes)), sizes)
+
+    positions, taken = sample_visit_positions(sizes, n_items, rng)
+
+    assert positions.shape == taken.shape == (len(sizes), 3)
+    assert np.array_equal(taken.sum(axis=1), n_items)
+
+    for size, row, mask in zip(sizes, positions, taken):
+        picked = row[mask]
+        assert len(set(picked)) == len(picked)
+        assert ((picked >= 0) & (picked < size)).all()
+
+
+def test_sample_visit_positions_full_section():
+    """Test that taking every product of a small section returns all of them."""
+    rng = np.random.default_rng(0)
+    sizes = np.full(20, 3, dtype=np.int64)
+    n_items = np.full(20, 3, dtype=np.int64)
+
+    positions, taken = sample_visit_positions(sizes, n_items, rng)
+
+    for row in positions:
+        assert sorted(row) == [0, 1, 2]
+
+
+def test_group_baskets():
+    """Test that products are deduplicated and grouped per basket."""
+    basket_ids = np.array([0, 0, 0, 2, 2, 1, 0])
+    items = np.array([4, 1, 4, 3, 0, 2, 1])
+
+    baskets = group_baskets(basket_ids, items, n_products=5)
+
+    assert [basket.tolist() for basket in baskets] == [[1, 4], [2], [0, 3]]
+    assert group_baskets(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 5) == []
+
+
+def test_baskets_to_cooccurrence():
+    """Test pair counts, symmetry and the zero diagonal."""
+    baskets = [np.array([0, 1, 2]), np.array([1, 2]), np.array([3])]
+
+    cooccurrence = baskets_to_cooccurrence(baskets, n_products=4).toarray()
+
+    expected = np.array([
+        [0, 1, 1, 0],
+        [1, 0, 2, 0],
+        [1, 2, 0, 0],
+        [0, 0, 0, 0]
+    ])
+    assert np.array_equal(cooccurrence, expected)
+    assert np.array_equal(cooccurrence, cooccurrence.T)
+    assert not cooccurrence.diagonal().any()
+    assert baskets_to_cooccurrence([], n_products=4).nnz == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])